@@ -0,0 +1,165 @@
+import argparse
+import json
+import platform
+import random
+import time
+from typing import Dict, List, Sequence
+from smart_calc import Calculator, CalculatorBaseError
+
+
+def variable_names(n_vars: int) -> List[str]:
+    """letter-only variable names: a, b, ..., z, aa, ab, ..."""
+    names = []
+    for i in range(n_vars):
+        name, i = '', i + 1
+        while i:
+            i, r = divmod(i - 1, 26)
+            name = chr(97 + r) + name
+        names.append(name if name != 'ans' else 'zans')
+    return names
+
+
+def random_number(rng: random.Random, integers: bool = False) -> str:
+    """a number close to 1 so that long chains of products and powers stay
+    finite, or a single digit integer"""
+    if integers:
+        return str(rng.randint(1, 9))
+    return f'{rng.uniform(0.5, 1.5):.3f}'
+
+
+def generate_expression(rng: random.Random, length: int, depth: int,
+                        ops: str, names: Sequence[str],
+                        integers: bool = False) -> str:
+    """
+    Random expression of "length" operands joined by operators drawn from
+    "ops", with parenthesis nested "depth" levels deep. Operands are
+    variables from "names" or random numbers (see "random_number").
+    """
+
+    def operand() -> str:
+        if names and (rng.random() < 0.5):
+            return rng.choice(names)
+        return random_number(rng, integers)
+
+    def chain(n: int) -> List[str]:
+        parts = [operand()]
+        for _ in range(n - 1):
+            parts.extend((rng.choice(ops), operand()))
+        return parts
+
+    def nested(n: int, levels: int) -> List[str]:
+        if (levels == 0) or (n < 2):
+            return chain(n)
+        outer = max(1, n // (levels + 1))
+        return (chain(outer) + [rng.choice(ops), '(']
+                + nested(n - outer, levels - 1) + [')'])
+
+    return ''.join(nested(max(1, length), depth))
+
+
+def run_case(name: str, length: int = 100, depth: int = 0,
+             ops: str = '+-*/^', n_vars: int = 5, expressions: int = 20,
+             repeat: int = 20, seed: int = 0,
+             backend: str = 'codegen', numeric: str = 'float',
+             integers: bool = False) -> Dict:
+    """
+    Compiles a set of generated expressions with an empty cache, then
+    evaluates each "repeat" times, recording every stage with a profiler.
+    The compile time includes generating code (codegen backend), which
+    happens the second time an expression is compiled. With "integers"
+    all numbers and variables are integers, which the fraction mode can
+    evaluate on its float fast path.
+    """
+
+    rng = random.Random(seed)
+    names = variable_names(n_vars)
+    sources = [generate_expression(rng, length, depth, ops, names, integers)
+               for _ in range(expressions)]
+
+    calc = Calculator(backend=backend, numeric=numeric)
+    calc.variables.update({n: calc.number(random_number(rng, integers))
+                           for n in names})
+    profiler = calc.attach_profiler()
+
+    errors = 0
+    start = time.perf_counter()
+    compiled = [calc.compile(source) for source in sources]
+    compiled = [calc.compile(source) for source in sources]
+    compile_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for expression in compiled:
+            try:
+                calc.evaluate(expression)
+            except (ArithmeticError, CalculatorBaseError):
+                errors += 1
+    evaluate_seconds = time.perf_counter() - start
+
+    return {'name': name,
+            'params': {'length': length, 'depth': depth, 'ops': ops,
+                       'n_vars': n_vars, 'expressions': expressions,
+                       'repeat': repeat, 'seed': seed, 'backend': backend,
+                       'numeric': numeric, 'integers': integers},
+            'characters': sum(len(s) for s in sources),
+            'rpn_tokens': sum(len(c.rpn) for c in compiled),
+            'fast_path': sum(c.fast is not None for c in compiled),
+            'compile_seconds': compile_seconds,
+            'evaluate_seconds': evaluate_seconds,
+            'errors': errors,
+            'stages': profiler.summary()}
+
+
+def suite(quick: bool = False) -> List[Dict]:
+    """cases varying one of length, nesting depth, operator mix and number
+    of variables at a time"""
+
+    scale = 10 if quick else 1
+    lengths = (10, 100, 1000) if quick else (10, 100, 1000, 10000)
+    cases = []
+    for length in lengths:
+        cases.append(dict(name=f'length-{length}', length=length))
+    for depth in (0, 5, 20, 50):
+        cases.append(dict(name=f'depth-{depth}', length=200, depth=depth))
+    for ops in ('+-', '*/', '^', '+-*/^'):
+        cases.append(dict(name=f'ops-{ops}', length=100, ops=ops))
+    for n_vars in (0, 1, 10, 100):
+        cases.append(dict(name=f'vars-{n_vars}', length=100, n_vars=n_vars))
+    for backend in Calculator.backends:
+        cases.append(dict(name=f'backend-{backend}', length=100,
+                          backend=backend))
+    for numeric in Calculator.numeric_modes:
+        cases.append(dict(name=f'numeric-{numeric}', length=20,
+                          ops='+-*/', numeric=numeric))
+        cases.append(dict(name=f'numeric-{numeric}-int', length=10,
+                          ops='+-*', numeric=numeric, integers=True))
+
+    for case in cases:
+        case['repeat'] = max(1, 20 // scale)
+    return cases
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Calculator benchmark '
+                                     'suite, writes its results as JSON')
+    parser.add_argument('-o', '--output', default='calc_benchmark.json')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-q', '--quick', action='store_true',
+                        help='smaller cases, for a quick check')
+    args = parser.parse_args()
+
+    results = []
+    for case in suite(args.quick):
+        result = run_case(seed=args.seed, **case)
+        results.append(result)
+        print(f'{result["name"]:<20} compile {result["compile_seconds"]:8.4f}'
+              f' s   evaluate {result["evaluate_seconds"]:8.4f} s')
+
+    report = {'python': platform.python_version(),
+              'platform': platform.platform(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'cases': results}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'results written to {args.output}')
@@ -0,0 +1,84 @@
+import argparse
+import asyncio
+import time
+from typing import List, Optional, Sequence
+
+
+FORMULAS = ('x*2+1', '(x+3)*(x-3)/2', 'x^2+x^0.5', 'y=x*7', 'y/x-1',
+            '(x+y)*(x-y)', 'ans+1')
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """nearest-rank percentile of an already sorted sequence"""
+    index = min(len(sorted_values) - 1, int(q/100*len(sorted_values)))
+    return sorted_values[index]
+
+
+async def _open(host: str, port: int, path: Optional[str]):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_client(client_id: int, requests: int, latencies: List[float],
+                     host: str, port: int, path: Optional[str]) -> None:
+    reader, writer = await _open(host, port, path)
+
+    lines = [f'x={client_id + 1}'] + [FORMULAS[i % len(FORMULAS)]
+                                       for i in range(requests - 1)]
+    for line in lines:
+        start = time.perf_counter()
+        writer.write(line.encode() + b'\n')
+        await writer.drain()
+        await reader.readline()
+        latencies.append(time.perf_counter() - start)
+
+    writer.write(b'\\exit\n')
+    await writer.drain()
+    await reader.readline()
+    writer.close()
+
+
+async def load_test(clients: int = 50, requests: int = 1000,
+                    host: str = '127.0.0.1', port: int = 8765,
+                    path: Optional[str] = None) -> dict:
+    """
+    Opens "clients" concurrent connections which each send "requests"
+    expressions one after another, waiting for every response. Reports the
+    overall throughput and the request latency percentiles in milliseconds.
+    """
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(i, requests, latencies, host, port,
+                                      path)
+                           for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {'requests': len(latencies),
+            'seconds': elapsed,
+            'requests_per_second': len(latencies)/elapsed,
+            'p50_ms': 1000*percentile(latencies, 50),
+            'p90_ms': 1000*percentile(latencies, 90),
+            'p99_ms': 1000*percentile(latencies, 99),
+            'max_ms': 1000*latencies[-1]}
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Load test a running '
+                                     'calculator server (calc_server.py)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('-u', '--unix', metavar='PATH', default=None)
+    parser.add_argument('-c', '--clients', type=int, default=50)
+    parser.add_argument('-n', '--requests', type=int, default=1000,
+                        help='requests per client')
+    args = parser.parse_args()
+
+    report = asyncio.run(load_test(args.clients, args.requests, args.host,
+                                   args.port, args.unix))
+    for key, value in report.items():
+        print(f'{key:>20}: {value:.3f}' if isinstance(value, float)
+              else f'{key:>20}: {value}')
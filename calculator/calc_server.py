@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+from typing import Optional
+from smart_calc import Calculator, EvaluationBudget, ExpressionCache
+
+
+# evaluation runs on the event loop, a request may only hold up the other
+# clients for a moment
+SERVER_BUDGET = EvaluationBudget(max_operations=100_000, max_digits=1000,
+                                 max_seconds=0.05)
+
+# longest input line in bytes, which also bounds the time spent compiling it
+MAX_LINE = 4096
+
+
+class CalculatorServer():
+
+    """
+    Serves calculator sessions to many concurrent clients over a local TCP or
+    Unix socket. The protocol is line based, every input line gets a single
+    line in response. Each connection has its own Calculator, and so its own
+    variables, while compiled expressions are shared between all of them
+    through one cache. Commands only ever affect the client sending them,
+    "\\exit" closes that client's connection. "\\save" and "\\load" are
+    not available, clients must not read or write the server's files.
+    Sessions use SERVER_BUDGET unless a "budget" is given.
+    """
+
+    def __init__(self, cache_size: int = 4096, **calculator_options) -> None:
+        self.cache = ExpressionCache(maxsize=cache_size)
+        self.calculator_options = calculator_options
+        self.calculator_options.setdefault('budget', SERVER_BUDGET)
+        self.clients = 0
+
+    def new_session(self) -> Calculator:
+        calc = Calculator(cache=self.cache, **self.calculator_options)
+        del calc.commands[r'\save'], calc.commands[r'\load']
+        return calc
+
+    @staticmethod
+    def respond(calc: Calculator, line: str) -> Optional[str]:
+        """response to a single input line, None once the client exits"""
+
+        user_input = calc.santitize_input(line)
+        try:
+            if user_input == r'\exit':
+                return None
+            if user_input.startswith('\\'):
+                # keep the (multi line) messages to a single response line
+                return ' '.join(calc.execute_command(user_input).split())
+            if user_input == '':
+                return ''
+            return calc.format_result(calc.calculate(user_input))
+
+        except Exception as err:  # the client is told, the session goes on
+            return f'\t {err}'
+
+    @staticmethod
+    async def discard_line(reader: asyncio.StreamReader) -> None:
+        """drops the rest of a line over the reader's limit, which may still
+        be arriving, up to and including its newline"""
+
+        while True:
+            try:
+                await reader.readuntil(b'\n')
+                return
+            except asyncio.LimitOverrunError as err:
+                await reader.readexactly(err.consumed)
+            except asyncio.IncompleteReadError:  # client disconnected
+                return
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        calc = self.new_session()
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError as err:  # last line
+                    line = err.partial
+                except asyncio.LimitOverrunError:  # over MAX_LINE
+                    await self.discard_line(reader)
+                    writer.write(b'\t Line too long\n')
+                    await writer.drain()
+                    continue
+                if not line:  # client disconnected
+                    break
+
+                response = self.respond(calc, line.decode(errors='replace'))
+                if response is None:
+                    writer.write(b'Bye!\n')
+                    await writer.drain()
+                    break
+
+                writer.write(response.encode() + b'\n')
+                await writer.drain()
+
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765,
+                    path: Optional[str] = None) -> None:
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_client,
+                                                     path=path,
+                                                     limit=MAX_LINE)
+        else:
+            server = await asyncio.start_server(self.handle_client, host,
+                                                port, limit=MAX_LINE)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Calculator server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('-u', '--unix', metavar='PATH', default=None,
+                        help='listen on a Unix socket instead of TCP')
+    parser.add_argument('-c', '--cache-size', type=int, default=4096)
+    parser.add_argument('-r', '--reactive', action='store_true')
+    parser.add_argument('-t', '--max-seconds', type=float,
+                        default=SERVER_BUDGET.max_seconds,
+                        help='longest time a single request may take')
+    args = parser.parse_args()
+
+    server = CalculatorServer(
+        cache_size=args.cache_size, reactive=args.reactive,
+        budget=SERVER_BUDGET._replace(max_seconds=args.max_seconds))
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
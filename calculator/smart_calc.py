@@ -1,13 +1,278 @@
+import argparse
+from array import array
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Context, Decimal, InvalidOperation
+from fractions import Fraction
+from functools import wraps
+import math
+from numbers import Number
+import operator
+import os
 import re
-from collections import namedtuple
+import struct
+import sys
+import time
+import zlib
+from collections import namedtuple, OrderedDict
+from typing import (Any, Callable, Dict, Iterable, Iterator, Optional, Set,
+                    TextIO, Tuple)
+
+try:
+    import numpy as np
+except ImportError:  # only needed by Calculator.evaluate_array
+    np = None
 
 
 Operator = namedtuple('Operator',
                       ('presidence', 'associativity', 'leading_value', 'eval'))
 
+# argument: name of the argument func takes, None if it takes none
 Command = namedtuple('Command',
-                     ('message', 'func'))
+                     ('message', 'func', 'argument'), defaults=(None,))
+
+Token = namedtuple('Token',
+                   ('kind', 'text', 'pos'))
+
+Variable = namedtuple('Variable',
+                      ('name',))
+
+# call of the function "name" with "argc" arguments, taken from the stack
+FunctionCall = namedtuple('FunctionCall',
+                          ('name', 'argc'))
+
+# exact float evaluation of an integer expression (see
+# Calculator.float_fast_path): func is its generated code over floats, the
+# magnitude of every intermediate result is at most 2**log2_scale * M**degree
+# where M >= 1 bounds the magnitude of the variables "names"
+FastPath = namedtuple('FastPath',
+                      ('func', 'log2_scale', 'degree', 'names'))
+
+# var_name is None unless the expression is an assignment, the rpn holds
+# numbers, operator symbols, FunctionCalls and (unresolved) Variables. func
+# is the generated Python function of the variables (None for the
+# interpreter backend), operations the number of operators and calls in the
+# rpn. For a function definition var_name is the function's name and params
+# the names of its parameters (otherwise None). fast is the FastPath of the
+# fraction mode (None if there is none)
+CompiledExpression = namedtuple('CompiledExpression',
+                                ('source', 'var_name', 'rpn', 'func',
+                                 'operations', 'params', 'fast'))
+
+# argc: number of arguments, eval: the function. User functions also keep
+# their definition (a CompiledExpression) and the cache of their results,
+# both are None for built-in functions
+Function = namedtuple('Function',
+                      ('argc', 'eval', 'definition', 'memo'))
+
+# limits on a single evaluation: the number of operations, the size of a
+# power's result in decimal digits (before or after the point) and the time
+# taken. math.inf lifts a limit
+EvaluationBudget = namedtuple('EvaluationBudget',
+                              ('max_operations', 'max_digits',
+                               'max_seconds'))
+
+# 4300 digits is also the longest integer Python converts to a string
+DEFAULT_BUDGET = EvaluationBudget(max_operations=1_000_000, max_digits=4300,
+                                  max_seconds=2.0)
+
+# numbers of any of the numeric modes (and complex results)
+NUMBER_TYPES = (float, int, complex, Fraction, Decimal)
+
+
+def estimate_digits(base: Number, exponent: Number) -> float:
+    """
+    Estimated size of base**exponent in decimal digits, log10|base**exponent|
+    worked out without computing the power. Positive for large results,
+    negative for results close to zero.
+    """
+
+    if isinstance(exponent, complex):
+        exponent = exponent.real
+    try:
+        exponent = float(exponent)
+    except OverflowError:  # integer too large for a float
+        exponent = math.copysign(math.inf, exponent)
+
+    magnitude = abs(base)
+    if (magnitude == 0) or (magnitude == 1):
+        return 0.0
+    try:
+        return math.log10(magnitude) * exponent
+    except (OverflowError, ValueError):  # out of the range of a float
+        if isinstance(magnitude, Decimal):
+            return float(magnitude.log10()) * exponent
+        return (math.log10(magnitude.numerator)
+                - math.log10(magnitude.denominator)) * exponent
+
+
+_ONE = Decimal(1)
+
+
+def small_integer(value: Number) -> Optional[int]:
+    """
+    value as an int if it is an integer smaller than 2**53 in magnitude,
+    which floats hold exactly, None otherwise. Decimals only count with a
+    zero exponent (e.g. not 2.0), others keep their trailing zeros.
+    """
+
+    if isinstance(value, Decimal):
+        if (not value.is_finite()) or (not value.same_quantum(_ONE)) or (
+                value.is_zero() and value.is_signed()):  # -0
+            return None
+        integer = int(value)
+    elif getattr(value, 'denominator', None) == 1:  # int or Fraction
+        integer = value.numerator
+    else:
+        return None
+
+    if -2**53 < integer < 2**53:
+        return integer
+    return None
+
+
+def _builtin(name: str, func: Callable) -> Callable:
+    """a math function raising InvalidExpressionError outside its
+    domain, which excludes complex numbers"""
+
+    @wraps(func)
+    def checked(x):
+        try:
+            return func(x)
+        except (TypeError, ValueError, InvalidOperation):
+            raise InvalidExpressionError(f'{name}({x}) is undefined')
+    return checked
+
+
+# all take a single argument, each has a NumPy function of the same name
+BUILTIN_FUNCTIONS = {name: _builtin(name, func) for name, func in (
+    ('abs', abs), ('sqrt', math.sqrt), ('exp', math.exp), ('log', math.log),
+    ('log10', math.log10), ('sin', math.sin), ('cos', math.cos),
+    ('tan', math.tan))}
+
+# Decimal context methods computing built-in functions to the precision
+DECIMAL_FUNCTIONS = {'abs': 'abs', 'sqrt': 'sqrt', 'exp': 'exp', 'log': 'ln',
+                     'log10': 'log10'}
+
+
+def resolve_function(functions: Dict[str, Function], name: str,
+                     argc: int) -> Callable:
+    """looks up a function called with "argc" arguments"""
+
+    try:
+        function = functions[name]
+    except KeyError:
+        raise UnknownFunctionError(f'Undefined function "{name}"') from None
+
+    if function.argc != argc:
+        raise InvalidExpressionError(f'"{name}" takes {function.argc} '
+                                     f'argument(s), {argc} given')
+    return function.eval
+
+
+def count_operations(rpn: tuple) -> int:
+    """number of operators and function calls in an rpn"""
+    return sum(1 for element in rpn
+               if isinstance(element, (str, FunctionCall)))
+
+
+# one letter tags of the rpn elements and numbers written to a workspace
+_ELEMENT_TAGS = {float: 'n', int: 'i', complex: 'j', Fraction: 'q',
+                 Decimal: 'd', str: 'o', Variable: 'v', FunctionCall: 'c'}
+
+_ELEMENT_TYPES = {'n': float, 'i': int, 'j': complex, 'q': Fraction,
+                  'd': Decimal, 'o': str, 'v': Variable}
+
+
+def encode_element(element: Any) -> str:
+    """an rpn element or number as text without spaces, e.g. "n0.5", "vx",
+    "o+" or "cf/2" for a call of f with 2 arguments"""
+
+    tag = _ELEMENT_TAGS[type(element)]
+    if tag == 'v':
+        return tag + element.name
+    if tag == 'c':
+        return f'{tag}{element.name}/{element.argc}'
+    return tag + str(element)  # exact for all of the number types
+
+
+def decode_element(text: str) -> Any:
+    """inverse of "encode_element" """
+
+    tag, text = text[0], text[1:]
+    if tag == 'c':
+        name, argc = text.split('/')
+        return FunctionCall(name, int(argc))
+    return _ELEMENT_TYPES[tag](text)
+
+
+class ExpressionCache():
+
+    """
+    Bounded least-recently-used mapping of expression source strings to their
+    compiled form. Once full, adding an expression evicts the one that was
+    used the longest time ago.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+class StageProfiler():
+
+    """
+    Accumulates the number of calls, the time spent and the number of tokens
+    handled by each stage of the calculator (see Calculator.attach_profiler).
+    """
+
+    def __init__(self) -> None:
+        self.stages = {}  # stage: [calls, seconds, tokens]
+
+    def record(self, stage: str, seconds: float, tokens: int) -> None:
+        totals = self.stages.setdefault(stage, [0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += tokens
+
+    def reset(self) -> None:
+        self.stages.clear()
+
+    def summary(self) -> Dict[str, dict]:
+        return {stage: {'calls': calls,
+                        'seconds': seconds,
+                        'tokens': tokens,
+                        'us_per_call': 1e6*seconds/calls,
+                        'tokens_per_second': tokens/seconds if seconds else 0}
+                for stage, (calls, seconds, tokens) in self.stages.items()}
 
 
 class Calculator():
@@ -21,38 +286,228 @@ class Calculator():
     alphabetic variable name to be used for future calculations. Upon
     evaluation of a non-assignment operation the result is automatically stored
     in the variable 'ans'.
+    Functions of their parameters are defined as e.g. f(x, y) = x^2 + y and
+    called as f(2, 3). Built-in functions:
+        abs, sqrt, exp, log, log10, sin, cos, tan
+    The \\functions command lists them and how often results were reused.
+    \\save <file> writes the variables, formulas and functions to a file,
+    \\load <file> replaces them with those saved in the file.
     """
 
-    def __init__(self) -> None:
+    backends = ('codegen', 'interpreter')
+    numeric_modes = ('float', 'fraction', 'decimal')
+
+    # evaluation time is checked every this many operations
+    _deadline_interval = 256
+
+    def __init__(self, cache: Optional[ExpressionCache] = None,
+                 backend: str = 'codegen', reactive: bool = False,
+                 budget: Optional[EvaluationBudget] = DEFAULT_BUDGET,
+                 memo_size: int = 1024, numeric: str = 'float',
+                 precision: int = 28) -> None:
+
+        if backend not in self.backends:
+            raise ValueError(f'Unknown backend "{backend}", expected one of '
+                             f'{self.backends}')
+        self.backend = backend
+        self.budget = budget  # None evaluates without any limits
+
+        # number type of all literals and results: float, exact fractions
+        # or decimals rounded to "precision" significant digits
+        if numeric not in self.numeric_modes:
+            raise ValueError(f'Unknown numeric mode "{numeric}", expected '
+                             f'one of {self.numeric_modes}')
+        self.numeric = numeric
+        self.precision = precision
+        self.context = Context(prec=precision)
+        self.number, arithmetic = self._arithmetic()
+
         self.commands = {r'\exit': Command('Bye!', lambda: exit()),
                          r'\help': Command(self.__doc__, lambda: None),
                          r'\clear': Command('Variables Erased',
-                                            lambda: self.variables.clear()),
+                                            lambda: self.clear_variables()),
+                         r'\functions': Command('Functions:',
+                                                lambda: self.list_functions()),
+                         r'\save': Command('Workspace saved',
+                                           lambda path:
+                                           self.save_workspace(path), 'file'),
+                         r'\load': Command('Workspace loaded',
+                                           lambda path:
+                                           self.load_workspace(path), 'file'),
                          }
 
         # op: ("presidence in RPN", "associativity (Left/Right)")
         # presidence and associativity used to convert to RPN
-        self.operators = {'+': Operator(2, 'L', 0.0, lambda a, b: a+b),
-                          '-': Operator(2, 'L', 0.0, lambda a, b: a-b),
-                          '*': Operator(3, 'L', None, lambda a, b: a*b),
-                          '/': Operator(3, 'L', None, lambda a, b: a/b),
-                          '^': Operator(4, 'R', None, lambda a, b: a**b),
-                          }
+        zero = self.number(0)
+        self.operators = {
+            '+': Operator(2, 'L', zero, arithmetic['+']),
+            '-': Operator(2, 'L', zero, arithmetic['-']),
+            '*': Operator(3, 'L', None, arithmetic['*']),
+            '/': Operator(3, 'L', None, arithmetic['/']),
+            '^': Operator(4, 'R', None, self.bounded_power(arithmetic['^'])),
+            }
+
+        # the same operators on floats, whatever the numeric mode. Used for
+        # NumPy arrays and the float fast path of the fraction mode
+        self.float_operators = {
+            '+': self.operators['+']._replace(eval=operator.add),
+            '-': self.operators['-']._replace(eval=operator.sub),
+            '*': self.operators['*']._replace(eval=operator.mul),
+            '/': self.operators['/']._replace(eval=operator.truediv),
+            '^': self.operators['^']._replace(
+                eval=self.bounded_power(operator.pow)),
+            }
 
         # name: (regex pattern, processing func)
         self.element_patterns = {
-                                 'arg': (re.compile(r'\d+|\d+\.\d*|\.\d*'),
-                                         float),
+                                 'arg': (re.compile(r'\d+\.\d*|\.\d+|\d+'),
+                                         self.number),
                                  'var': (re.compile(r'[a-zA-Z]+'),
-                                         lambda s: self.variables.get(s, s)),
+                                         Variable),
                                  'op': (re.compile(r'[+\-*\/^=]+'),
                                         self.resolve_op),
-                                 'sep': (re.compile(r'[()]'),
+                                 'sep': (re.compile(r'[(),]'),
                                          lambda s: s),
                                  }
 
+        # all element patterns combined into one regex, the name of the group
+        # that matched gives the kind of element
+        self._scanner = re.compile('|'.join(
+            f'(?P<{name}>{patt.pattern})'
+            for name, (patt, _) in self.element_patterns.items()))
+
         self.variables = {}
         self.expression = deque()
+        self.cache = ExpressionCache() if cache is None else cache
+        # compiled expressions hold numbers of the numeric mode
+        self._cache_tag = (None if numeric == 'float'
+                           else (numeric, precision))
+        self.profiler = None
+
+        # spreadsheet mode, assignments are kept as formulas and recomputed
+        # whenever a variable they depend on is reassigned
+        self.reactive = reactive
+        self.formulas: Dict[str, CompiledExpression] = {}
+        self.dependencies: Dict[str, Set[str]] = {}  # var: vars it reads
+        self.dependents: Dict[str, Set[str]] = {}  # var: vars reading it
+
+        # results of user functions are cached per argument tuple, up to
+        # "memo_size" per function
+        self.memo_size = memo_size
+        self.functions: Dict[str, Function] = {}
+        # compiled function definitions still in use, in order, by a number
+        # counting every definition made (see "_evaluate_chunk")
+        self.definitions: Dict[int, CompiledExpression] = {}
+        self._defined = 0
+        self.reset_functions()
+
+    def _arithmetic(self) -> Tuple[Callable, Dict[str, Callable]]:
+        """the number type of the numeric mode and its +, -, *, /, ^"""
+
+        arithmetic = {'+': operator.add, '-': operator.sub,
+                      '*': operator.mul, '/': operator.truediv,
+                      '^': operator.pow}
+
+        if self.numeric == 'fraction':
+            def power(a, b):
+                result = a**b
+                if isinstance(result, (float, int)):  # irrational, e.g. 2^.5
+                    return Fraction(result)
+                return result
+
+            # fractions grow without bound, every result is size checked
+            arithmetic = {symbol: self.bounded_size(symbol, op)
+                          for symbol, op in arithmetic.items()}
+            arithmetic['^'] = power
+            return Fraction, arithmetic
+
+        if self.numeric == 'decimal':
+            ctx = self.context
+            return ctx.create_decimal, {'+': ctx.add, '-': ctx.subtract,
+                                        '*': ctx.multiply, '/': ctx.divide,
+                                        '^': ctx.power}
+
+        return float, arithmetic
+
+    def _builtin(self, name: str) -> Callable:
+        """the built-in function "name" for the numeric mode"""
+
+        func = BUILTIN_FUNCTIONS[name]
+        if self.numeric == 'fraction':
+            return _builtin(name, lambda x: Fraction(func(x)))
+
+        if self.numeric == 'decimal':
+            if name in DECIMAL_FUNCTIONS:
+                return _builtin(name, getattr(self.context,
+                                              DECIMAL_FUNCTIONS[name]))
+            return _builtin(name, lambda x: self.context.create_decimal(
+                func(x)))
+
+        return func
+
+    # method: (stage name, tokens handled given the calculator, the method's
+    # arguments and its result). "evaluate" covers both backends, with the
+    # interpreter it is the time spent in "calculate_expression"
+    _profiled_stages = {
+        'parse_input': ('parse_input',
+                        lambda calc, args, result: len(result)),
+        'convert_expression_to_rpn': ('convert_expression_to_rpn',
+                                      lambda calc, args, result:
+                                      len(calc.expression)),
+        'fold_constants': ('fold_constants',
+                           lambda calc, args, result: len(args[0])),
+        'generate_code': ('generate_code',
+                          lambda calc, args, result: len(args[0])),
+        'evaluate': ('calculate_expression',
+                     lambda calc, args, result: len(args[0].rpn)),
+        }
+
+    def attach_profiler(self, profiler: Optional[StageProfiler] = None
+                        ) -> StageProfiler:
+        """
+        Starts recording the time and token count of every call to the
+        calculator's stages. The timing wrappers are only installed on this
+        instance while a profiler is attached, without one there is no
+        overhead at all.
+        """
+
+        self.detach_profiler()
+        self.profiler = StageProfiler() if profiler is None else profiler
+
+        for method_name, (stage, count) in self._profiled_stages.items():
+            method = getattr(self, method_name)
+
+            @wraps(method)
+            def timed(*args, _method=method, _stage=stage, _count=count):
+                start = time.perf_counter()
+                result = _method(*args)
+                self.profiler.record(_stage, time.perf_counter() - start,
+                                     _count(self, args, result))
+                return result
+
+            setattr(self, method_name, timed)
+
+        return self.profiler
+
+    def detach_profiler(self) -> Optional[StageProfiler]:
+        profiler, self.profiler = self.profiler, None
+        for method_name in self._profiled_stages:
+            self.__dict__.pop(method_name, None)
+        return profiler
+
+    def clear_variables(self) -> None:
+        self.variables.clear()
+        self.formulas.clear()
+        self.dependencies.clear()
+        self.dependents.clear()
+
+    def reset_functions(self) -> None:
+        """removes all user functions, leaving the built-in ones"""
+        self.functions.clear()
+        self.functions.update(
+            (name, Function(1, self._builtin(name), None, None))
+            for name in BUILTIN_FUNCTIONS)
+        self.definitions.clear()
 
     def _continue_operator_stack_pop(self, operator_stack: deque,
                                      token: str) -> bool:
@@ -89,16 +544,20 @@ class Calculator():
 
         output_queue = deque()
         op_stack = deque()  # top is the right side
+        arg_counts = []  # arguments so far of each open function call
+        previous = None
 
         while self.expression:
             element = self.expression.popleft()
 
-            if isinstance(element, str) and element.isalnum():
-                raise UnknownVariableError(f'Undeclared variable "{element}"')
-
-            if isinstance(element, float):
+            if isinstance(element, NUMBER_TYPES) or isinstance(element,
+                                                               Variable):
                 output_queue.append(element)  # numbers pass right to output
 
+            elif isinstance(element, FunctionCall):
+                op_stack.append(element)  # always followed by its (
+                arg_counts.append(1)
+
             elif element in self.operators:
                 # pop higher presidence operators / () before pushing to stack
                 while self._continue_operator_stack_pop(op_stack, element):
@@ -108,6 +567,18 @@ class Calculator():
             elif element == '(':
                 op_stack.append(element)  # automatically ( get pushed to stack
 
+            elif element == ',':
+                # finish the previous argument, only valid directly inside
+                # the parenthesis of a function call
+                try:
+                    while (op_stack[-1] != '('):
+                        output_queue.append(op_stack.pop())
+                    if not isinstance(op_stack[-2], FunctionCall):
+                        raise IndexError
+                except IndexError:
+                    raise InvalidExpressionError('Misplaced ","')
+                arg_counts[-1] += 1
+
             elif element == ')':
                 # when closing ) found push all operators to the output
                 # and discard (
@@ -118,32 +589,136 @@ class Calculator():
                 except IndexError:
                     raise InvalidExpressionError("Unbalanced parenthesis")
 
+                if op_stack and isinstance(op_stack[-1], FunctionCall):
+                    argc = arg_counts.pop()
+                    if previous == '(':  # no arguments, "f()"
+                        argc = 0
+                    output_queue.append(op_stack.pop()._replace(argc=argc))
+
+            previous = element
+
         while op_stack:
             output_queue.append(op_stack.pop())
 
         while output_queue:
             self.expression.append(output_queue.popleft())
 
-    def calculate_expression(self) -> float:
+    def check_power(self, a: float, b: float) -> None:
+        """
+        Raises BudgetExceededError if a^b would be larger (or closer to zero,
+        for exact numbers) than the budget allows. The size is estimated, so
+        a runaway power such as 9^9^9 is rejected without being computed.
+        """
+
+        if ((self.budget is not None) and isinstance(a, Number)
+                and isinstance(b, Number)):
+            digits = estimate_digits(a, b)
+            # tiny floats just round to zero, decimals to their precision
+            rounded = (float, complex, Decimal)
+            inexact = isinstance(a, rounded) or isinstance(b, rounded)
+
+            if ((digits > self.budget.max_digits)
+                    or ((digits < -self.budget.max_digits) and not inexact)):
+                raise BudgetExceededError(
+                    f'Result of "^" would have about {abs(digits):.3g} '
+                    f'digits, the limit is {self.budget.max_digits}')
+
+    def bounded_power(self, power: Callable) -> Callable:
+        """a power function checking the budget first"""
+
+        def bounded(a, b):
+            if (type(a) is float) and (type(b) is float):
+                # always quick, only an overflow is checked
+                try:
+                    return power(a, b)
+                except OverflowError:
+                    self.check_power(a, b)
+                    raise
+
+            self.check_power(a, b)
+            return power(a, b)
+        return bounded
+
+    def bounded_size(self, symbol: str, op: Callable) -> Callable:
+        """an operator raising BudgetExceededError if the numerator or
+        denominator of its (fraction) result has too many digits"""
+
+        if self.budget is None:
+            return op
+        max_bits = self.budget.max_digits * math.log2(10)
+
+        def bounded(a, b):
+            result = op(a, b)
+            if not isinstance(result, Fraction):  # complex
+                return result
+            bits = max(result.numerator.bit_length(),
+                       result.denominator.bit_length())
+            if bits > max_bits:
+                raise BudgetExceededError(
+                    f'Result of "{symbol}" has about {bits*math.log10(2):.3g}'
+                    f' digits, the limit is {self.budget.max_digits}')
+            return result
+        return bounded
+
+    def check_operations(self, operations: int) -> None:
+        if (self.budget is not None) and (operations
+                                          > self.budget.max_operations):
+            raise BudgetExceededError(
+                f'Expression has {operations} operations, the limit is '
+                f'{self.budget.max_operations}')
+
+    def deadline(self) -> float:
+        """time (perf_counter) by which an evaluation started now has to
+        finish"""
+        if self.budget is None:
+            return math.inf
+        return time.perf_counter() + self.budget.max_seconds
+
+    def calculate_expression(self, functions: Optional[dict] = None
+                             ) -> float:
         """
         Converts valid infix expressions to reverse polish notation then
-        calculates and returns the resulting value
+        calculates and returns the resulting value. The operation count and
+        the elapsed time are checked against the budget as it goes. Function
+        calls are looked up in "functions" (by default "self.functions").
         """
 
         # top of input and comp stack is the left
         # self.convert_expression_to_rpn()
         comp_stack = deque()
+        deadline = self.deadline()
+        operations = 0
+        if functions is None:
+            functions = self.functions
 
-        while self.expression:
-            element = self.expression.popleft()
+        # a function call evaluates its body with a new self.expression
+        expression = self.expression
+        while expression:
+            element = expression.popleft()
 
-            if isinstance(element, (float, int)):
+            if isinstance(element, NUMBER_TYPES):
                 comp_stack.appendleft(element)
                 continue
 
-            if element not in self.operators:
+            is_call = isinstance(element, FunctionCall)
+            if (not is_call) and (element not in self.operators):
                 raise InvalidExpressionError(f'Unknown operator: {element}')
 
+            operations += 1
+            if operations % self._deadline_interval == 0:
+                self.check_operations(operations)
+                if time.perf_counter() > deadline:
+                    raise BudgetExceededError('Evaluation took too long')
+
+            if is_call:
+                func = resolve_function(functions, element.name,
+                                        element.argc)
+                if len(comp_stack) < element.argc:
+                    raise InvalidExpressionError('Missing operands')
+                args = [comp_stack.popleft() for _ in range(element.argc)]
+                comp_stack.appendleft(func(*reversed(args)))
+                continue
+
             try:
                 b = comp_stack.popleft()
                 a = comp_stack.popleft()
@@ -152,8 +727,179 @@ class Calculator():
 
             comp_stack.appendleft(self.operators[element].eval(a, b))
 
+        if not comp_stack:
+            raise InvalidExpressionError('Missing operands')
         return comp_stack.pop()
 
+    def fold_constants(self, rpn: tuple, deadline: float = math.inf
+                       ) -> tuple:
+        """
+        Replaces every subexpression made up only of numbers with its value.
+        Works on the RPN, so the grouping given by the operators' presidence
+        and associativity is kept and operands are never reordered (floating
+        point arithmetic is not associative) and results are unchanged.
+        Operations that fail, e.g. a division by zero, are left in place to
+        raise their error when the expression is evaluated. Calls of built-in
+        functions are folded as well, user functions are only known when the
+        expression is evaluated. Folding computes values, so "deadline" (see
+        "deadline") is checked periodically like in an evaluation.
+        """
+
+        stack = []  # (is constant, deque of rpn elements)
+        folded = 0
+
+        for element in rpn:
+            if isinstance(element, NUMBER_TYPES):
+                stack.append((True, deque([element])))
+                continue
+
+            if isinstance(element, Variable):
+                stack.append((False, deque([element])))
+                continue
+
+            if isinstance(element, FunctionCall):
+                argc, func = element.argc, None
+                if (element.name in BUILTIN_FUNCTIONS) and (argc == 1):
+                    func = self.functions[element.name].eval
+            elif element in self.operators:
+                argc, func = 2, self.operators[element].eval
+            else:
+                return rpn  # malformed, leave it to raise on evaluation
+
+            if len(stack) < argc:
+                return rpn
+
+            operands = stack[len(stack) - argc:]
+            del stack[len(stack) - argc:]
+
+            if (func is not None) and all(const for const, _ in operands):
+                folded += 1
+                if ((folded % self._deadline_interval == 0)
+                        and (time.perf_counter() > deadline)):
+                    raise BudgetExceededError('Evaluation took too long')
+                try:
+                    value = func(*(segment[0] for _, segment in operands))
+                    stack.append((True, deque([value])))
+                    continue
+                except Exception:
+                    pass
+
+            # join the operands' elements, copying all but the longest
+            segments = [segment for _, segment in operands] or [deque()]
+            longest = max(range(len(segments)),
+                          key=lambda i: len(segments[i]))
+            segment = segments[longest]
+            for other in reversed(segments[:longest]):
+                segment.extendleft(reversed(other))
+            for other in segments[longest + 1:]:
+                segment.extend(other)
+            segment.append(element)
+            stack.append((False, segment))
+
+        return tuple(elem for _, segment in stack for elem in segment)
+
+    def generate_code(self, rpn: tuple, operators: Optional[dict] = None
+                      ) -> Callable[[dict, dict], float]:
+        """
+        Compiles an expression in reverse polish notation into a Python
+        function of the variables and functions mappings. Every RPN step
+        becomes a single assignment to a local variable and the operator
+        functions are bound once here, so evaluating the function involves no
+        stack, no operator lookups and leaves "rpn" untouched. Repeated
+        subexpressions are only computed once, their local is reused. Gives
+        the same results and raises the same errors as
+        "calculate_expression". Called functions are looked up once per
+        evaluation, so the code does not depend on the functions defined
+        when it was generated. The function takes an optional deadline (see
+        "deadline") which is checked periodically. "operators" replaces the
+        calculator's operators (e.g. by "float_operators").
+        """
+
+        if operators is None:
+            operators = self.operators
+
+        namespace = {'UnknownVariableError': UnknownVariableError,
+                     'BudgetExceededError': BudgetExceededError,
+                     'resolve_function': resolve_function,
+                     'inf': math.inf, 'clock': time.perf_counter}
+        loads, steps, stack = [], [], []
+        local_names, op_names = {}, {}
+        values = {}  # subexpression: local holding its value
+
+        for element in rpn:
+            if isinstance(element, NUMBER_TYPES):
+                # repr keeps e.g. 0.0 and -0.0 apart, they compare equal
+                key = (type(element), repr(element))
+                if key not in values:
+                    values[key] = f'k{len(namespace)}'
+                    namespace[values[key]] = element
+                stack.append(values[key])
+                continue
+
+            if isinstance(element, Variable):
+                if element.name not in local_names:
+                    local_names[element.name] = f'v{len(local_names)}'
+                    loads.append(f'{local_names[element.name]} = '
+                                 f'variables[{element.name!r}]')
+                stack.append(local_names[element.name])
+                continue
+
+            if isinstance(element, FunctionCall):
+                if element not in op_names:  # resolved where first called
+                    op_names[element] = f'f{len(op_names)}'
+                    steps.append(f'{op_names[element]} = resolve_function('
+                                 f'functions, {element.name!r}, '
+                                 f'{element.argc})')
+                if len(stack) < element.argc:
+                    raise InvalidExpressionError('Missing operands')
+                args = stack[len(stack) - element.argc:]
+                del stack[len(stack) - element.argc:]
+
+            elif element in operators:
+                try:
+                    b = stack.pop()
+                    a = stack.pop()
+                except IndexError:
+                    raise InvalidExpressionError('Missing operands')
+                args = [a, b]
+
+                if element not in op_names:
+                    op_names[element] = f'op{len(op_names)}'
+                    namespace[op_names[element]] = operators[element].eval
+
+            else:
+                raise InvalidExpressionError(f'Unknown operator: {element}')
+
+            key = (element, *args)
+            if key not in values:
+                values[key] = f'r{len(steps)}'
+                steps.append(f'{values[key]} = {op_names[element]}'
+                             f'({", ".join(args)})')
+                if len(steps) % self._deadline_interval == 0:
+                    steps.append('if clock() > deadline: raise '
+                                 'BudgetExceededError(\'Evaluation took '
+                                 'too long\')')
+            stack.append(values[key])
+
+        if not stack:
+            raise InvalidExpressionError('Missing operands')
+
+        lines = ['def _evaluate(variables, functions, deadline=inf):']
+        if loads:
+            lines.append('    try:')
+            lines.extend(f'        {load}' for load in loads)
+            lines.extend([
+                '    except KeyError as err:',
+                '        raise UnknownVariableError(',
+                '            f\'Undeclared variable "{err.args[0]}"\'',
+                '            ) from None',
+                ])
+        lines.extend(f'    {step}' for step in steps)
+        lines.append(f'    return {stack[0]}')  # as in calculate_expression
+
+        exec(compile('\n'.join(lines), '<expression>', 'exec'), namespace)
+        return namespace['_evaluate']
+
     def resolve_op(self, op_str: str) -> str:
         """resolves non-unitary + and - operators to unitary operators"""
         if len(op_str) == 1:
@@ -164,29 +910,99 @@ class Calculator():
 
         return '-' if (op_str.count('-') % 2 == 1) else '+'
 
+    def tokenize(self, user_input: str) -> Iterator[Token]:
+        """
+        Splits an input expression string into tokens in a single pass over
+        the string, matching the combined element pattern at each position
+        rather than slicing off the remaining input.
+        """
+
+        match = self._scanner.match
+        i, end = 0, len(user_input)
+        while i < end:
+            m = match(user_input, i)
+            if m is None:  # no element pattern matches at this position
+                raise InvalidExpressionError(f'Input error at position {i}')
+
+            yield Token(m.lastgroup, m.group(), i)
+            i = m.end()
+
     def parse_input(self, user_input: str) -> deque:
         """
         Parses an input expression string splitting it into arguements,
         variables, operators, and parenthesis. Outputs a queue of operators and
         arguements in infix notation. Non unitary + or - operators are
-        interpreted.
+        interpreted. A name directly followed by "(" is a function call.
         """
 
-        out_queue = deque()
-        i = 0
-        while user_input[i:]:
-            for patt, func in self.element_patterns.values():
-                match = re.match(patt, user_input[i:])
-                if not match:  # no match found
-                    continue
+        patterns = self.element_patterns
+        funcs = {name: func for name, (_, func) in patterns.items()}
+        elements = [funcs[token.kind](token.text)
+                    for token in self.tokenize(user_input)]
 
-                out_queue.append(func(match[0]))
-                i += match.end()
-                break
-            else:
-                raise InvalidExpressionError(f'Input error at position {i}')
+        for i in range(len(elements) - 1):
+            if isinstance(elements[i], Variable) and (elements[i + 1] == '('):
+                elements[i] = FunctionCall(elements[i].name, 0)
+        return deque(elements)
+
+    def pop_signature(self) -> Tuple[str, Tuple[str, ...]]:
+        """
+        "pop_var_name" for function definitions, "f(x, y) = expression".
+        Removes the function's name and parameters from the queue, leaving
+        its body, and returns them.
+        """
+
+        if self.expression.count('=') != 1:
+            raise InvalidExpressionError('Only 1 "=" in assignment expression')
 
-        return out_queue
+        name = self.expression.popleft().name
+        self.expression.popleft()  # "(", always follows a function name
+        params = []
+        try:
+            while True:
+                param = self.expression.popleft()
+                if not isinstance(param, Variable):
+                    raise InvalidVariableError('parameter names have only '
+                                               f'letters (error: {param})')
+                params.append(param.name)
+
+                separator = self.expression.popleft()
+                if separator == ')':
+                    break
+                if separator != ',':
+                    raise InvalidExpressionError('Invalid function '
+                                                 'definition')
+
+            if self.expression.popleft() != '=':
+                raise InvalidExpressionError('Invalid function definition')
+        except IndexError:
+            raise InvalidExpressionError('Invalid function definition')
+
+        if not self.expression:
+            raise InvalidExpressionError('missing function body')
+        if len(set(params)) != len(params):
+            raise InvalidVariableError('Repeated parameter name')
+        if name in BUILTIN_FUNCTIONS:
+            raise InvalidVariableError(f'"{name}" is a built-in function')
+        return name, tuple(params)
+
+    def insert_leading_values(self) -> None:
+        """
+        checks leading +/- signs, at the start of the expression or of a
+        parenthesis or function argument: "-x" is read as "0-x"
+        """
+
+        expression, previous = deque(), None
+        for element in self.expression:
+            if (element in self.operators) and ((previous is None)
+                                                or (previous in ('(', ','))):
+                val = self.operators[element].leading_value
+                if val is None:
+                    raise InvalidExpressionError("Missing operands")
+                expression.append(val)
+            expression.append(element)
+            previous = element
+        self.expression = expression
 
     def pop_var_name(self) -> str:
         """
@@ -207,18 +1023,660 @@ class Calculator():
         var_name = self.expression.popleft()
         self.expression.popleft()  # remove "="
 
-        if var_name.isalpha():
-            return var_name
+        if isinstance(var_name, Variable):
+            return var_name.name
         raise InvalidVariableError('variable names have only letters '
                                    f'(error: {var_name})')
 
-    def run_command(self, cmd_str) -> None:
+    def find_command(self, cmd_str: str) -> Tuple[Command, list]:
+        """the command of an input, e.g. "\\save ws.calc", and its
+        argument (an empty list for commands without one)"""
+
+        name, *args = cmd_str.split(' ', 1)
         try:
-            print(self.commands[cmd_str].message)
-            self.commands[cmd_str].func()
+            command = self.commands[name]
         except KeyError:
             raise UnknownCommandError(f'Unsupported command: {cmd_str}')
 
+        if len(args) != (command.argument is not None):
+            usage = (name if command.argument is None
+                     else f'{name} <{command.argument}>')
+            raise UnknownCommandError(f'Usage: {usage}')
+        return command, args
+
+    def run_command(self, cmd_str) -> None:
+        command, args = self.find_command(cmd_str)
+
+        if args:  # only report once it worked, an argument can be wrong
+            output = command.func(*args)
+            print(command.message)
+        else:
+            print(command.message)
+            output = command.func()  # some commands also report something
+        if output:
+            print(output)
+
+    def execute_command(self, cmd_str) -> str:
+        """runs a command and returns its message instead of printing it"""
+        command, args = self.find_command(cmd_str)
+
+        output = command.func(*args)
+        if output:
+            return f'{command.message}\n{output}'
+        return command.message
+
+    def compile(self, user_input: str) -> CompiledExpression:
+        """
+        Parses an expression and converts it to reverse polish notation,
+        leaving variables unresolved so the result can be evaluated again
+        against later variable values. Compiled expressions are kept in an
+        LRU cache keyed by the input string, a known expression is not parsed
+        again. With the codegen backend the Python function is generated the
+        second time an expression is compiled, expressions used only once
+        (e.g. most lines of a batch) are interpreted and skip that cost.
+        """
+
+        key = (user_input if self._cache_tag is None
+               else (self._cache_tag, user_input))
+        compiled = self.cache.get(key)
+        if compiled is not None:
+            if (self.backend == 'codegen') and (compiled.func is None):
+                compiled = self.with_code(compiled)
+                self.cache.put(key, compiled)
+            return compiled
+
+        self.expression = self.parse_input(user_input)
+
+        # check for an assignment or a function definition
+        var_name, params = None, None
+        if '=' in self.expression:
+            if isinstance(self.expression[0], FunctionCall):
+                var_name, params = self.pop_signature()
+            else:
+                var_name = self.pop_var_name()
+
+        self.insert_leading_values()
+        self.convert_expression_to_rpn()
+
+        # the budget applies to the expression as written, folding already
+        # computes its constant parts
+        rpn = tuple(self.expression)
+        self.expression.clear()
+        self.check_operations(count_operations(rpn))
+        rpn = self.fold_constants(rpn, self.deadline())
+
+        if params is not None:
+            self._check_function_body(var_name, params, rpn)
+
+        compiled = CompiledExpression(user_input, var_name, rpn, None,
+                                      count_operations(rpn), params, None)
+        self.cache.put(key, compiled)
+        return compiled
+
+    def with_code(self, compiled: CompiledExpression) -> CompiledExpression:
+        """compiled with its generated function and float fast path. A
+        malformed expression is left to the interpreter, which reports its
+        errors in the order it comes across them (e.g. "z+" with "z"
+        undeclared)"""
+        try:
+            func = self.generate_code(compiled.rpn)
+        except InvalidExpressionError:
+            return compiled
+        return compiled._replace(func=func,
+                                 fast=self.float_fast_path(compiled.rpn))
+
+    def float_fast_path(self, rpn: tuple) -> Optional[FastPath]:
+        """
+        Fraction mode only. Integer arithmetic (+, -, * and ^ by a
+        constant) is exact in floats as long as no intermediate result
+        reaches 2**53, and much faster than with fractions. For such
+        expressions this returns the float code and a bound on the
+        intermediate results in terms of the largest variable, which
+        "evaluate" checks to decide between the two. Otherwise None.
+        """
+
+        # decimals follow their own rules where floats do not (0^0 is
+        # invalid, zeros keep their sign, results round to the precision)
+        if self.numeric != 'fraction':
+            return None
+
+        float_rpn, names = [], set()
+        stack = []  # (log2 scale, degree, integer value of a constant)
+
+        for element in rpn:
+            if isinstance(element, Variable):
+                names.add(element.name)
+                stack.append((0.0, 1, None))
+
+            elif isinstance(element, NUMBER_TYPES):
+                integer = small_integer(element)
+                if integer is None:
+                    return None
+                stack.append((math.log2(max(abs(integer), 1)), 0, integer))
+                element = float(integer)
+
+            elif element in ('+', '-', '*', '^') and (len(stack) >= 2):
+                b_scale, b_degree, b_value = stack.pop()
+                a_scale, a_degree, _ = stack.pop()
+
+                if element == '*':
+                    stack.append((a_scale + b_scale, a_degree + b_degree,
+                                  None))
+                elif element == '^':
+                    if (b_value is None) or (b_value < 0):
+                        return None
+                    n = max(b_value, 1)
+                    stack.append((a_scale*n, a_degree*n, None))
+                else:  # |a +- b| <= |a| + |b|
+                    high, low = max(a_scale, b_scale), min(a_scale, b_scale)
+                    stack.append((high + math.log2(1 + 2**(low - high)),
+                                  max(a_degree, b_degree), None))
+            else:
+                return None  # division, function calls, malformed
+            float_rpn.append(element)
+
+        if len(stack) != 1:
+            return None
+
+        # powers of integers in ints, float pow is not always exact
+        operators = dict(self.float_operators)
+        operators['^'] = operators['^']._replace(eval=self.bounded_power(
+            lambda a, b: float(int(a)**int(b))))
+
+        scale, degree, _ = stack[0]
+        return FastPath(self.generate_code(tuple(float_rpn), operators),
+                        scale, degree, tuple(names))
+
+    def _evaluate_fast(self, fast: FastPath, variables: dict,
+                       deadline: float) -> Optional[Number]:
+        """the result of a FastPath, None if floats may not be exact for
+        these variables"""
+
+        values, largest = {}, 1
+        for name in fast.names:
+            integer = small_integer(variables.get(name))
+            if integer is None:  # also for undeclared variables
+                return None
+            values[name] = float(integer)
+            largest = max(largest, abs(integer))
+
+        if fast.log2_scale + fast.degree*math.log2(largest) >= 53:
+            return None
+        return self.number(int(fast.func(values, self.functions, deadline)))
+
+    @staticmethod
+    def _check_function_body(name: str, params: Tuple[str, ...],
+                             rpn: tuple) -> None:
+        for element in rpn:
+            if isinstance(element, Variable) and (element.name not in params):
+                raise InvalidExpressionError(
+                    f'"{name}" can only use its parameters, not '
+                    f'"{element.name}"')
+            if isinstance(element, FunctionCall) and (element.name == name):
+                raise InvalidExpressionError(f'"{name}" can not call itself')
+
+    def evaluate(self, compiled: CompiledExpression,
+                 variables: Optional[dict] = None,
+                 functions: Optional[dict] = None) -> float:
+        """
+        resolves the variables of a compiled expression against their current
+        values and calculates the result, within the budget. "variables" and
+        "functions" default to those of the calculator.
+        """
+
+        if variables is None:
+            variables = self.variables
+        if functions is None:
+            functions = self.functions
+
+        self.check_operations(compiled.operations)
+
+        if (self.backend == 'codegen') and (compiled.func is not None):
+            deadline = self.deadline()
+            if compiled.fast is not None:
+                value = self._evaluate_fast(compiled.fast, variables,
+                                            deadline)
+                if value is not None:
+                    return value
+            return compiled.func(variables, functions, deadline)
+
+        self.expression = deque()
+        for element in compiled.rpn:
+            if isinstance(element, Variable):
+                try:
+                    element = variables[element.name]
+                except KeyError:
+                    raise UnknownVariableError('Undeclared variable '
+                                               f'"{element.name}"')
+            self.expression.append(element)
+
+        return self.calculate_expression(functions)
+
+    def evaluate_array(self, user_input: str, arrays: Dict[str, Any]) -> Any:
+        """
+        Evaluates an expression once over whole arrays of variable values
+        using NumPy array arithmetic, instead of once per value. "arrays" maps
+        variable names to array-likes which are broadcast against each other,
+        other variables are taken from "variables". Returns a float array of
+        the broadcast shape. As with any NumPy arithmetic, invalid operations
+        (e.g. a division by zero) give inf/nan elements rather than an error.
+        Built-in functions use their NumPy counterparts, user functions are
+        called once per element. Numbers and scalar variables are NumPy
+        floats, so the exact numeric modes compute in floats here as well.
+        """
+
+        if np is None:
+            raise ImportError('Calculator.evaluate_array requires NumPy')
+
+        compiled = self.compile(self.santitize_input(user_input))
+        if compiled.var_name is not None:
+            raise InvalidExpressionError('Assignments can not be evaluated '
+                                         'over arrays')
+
+        def to_float(value):
+            # NumPy scalars, which give inf/nan like the arrays do
+            if isinstance(value, complex):
+                return np.complex128(value)
+            if isinstance(value, NUMBER_TYPES):
+                return np.float64(value)
+            return value
+
+        variables = {name: to_float(value)
+                     for name, value in self.variables.items()}
+        for name, values in arrays.items():
+            variables[name] = np.asarray(values, dtype=float)
+        shape = np.broadcast_shapes(*(variables[name].shape
+                                      for name in arrays))
+
+        functions = {}
+        for name, function in self.functions.items():
+            if function.definition is None:  # built-in
+                functions[name] = function._replace(eval=getattr(np, name))
+            else:
+                functions[name] = function._replace(eval=np.vectorize(
+                    lambda *args, _eval=function.eval: _eval(
+                        *map(self.number, args)),
+                    otypes=[float]))
+
+        func = self.generate_code(tuple(map(to_float, compiled.rpn)),
+                                  self.float_operators)
+        with np.errstate(all='ignore'):
+            result = func(variables, functions)
+
+        return np.broadcast_to(np.asarray(result, dtype=float), shape).copy()
+
+    def store_result(self, compiled: CompiledExpression,
+                     value: float) -> None:
+        self.variables['ans'] = value  # save last answer
+
+        if compiled.var_name:
+            self.variables[compiled.var_name] = value
+
+    def apply(self, compiled: CompiledExpression) -> float:
+        """evaluates a compiled input, updates the variables and returns the
+        result (the new Function for a function definition)"""
+
+        if compiled.params is not None:
+            return self.define_function(compiled)
+
+        if self.reactive and compiled.var_name:
+            return self.apply_formula(compiled)
+
+        value = self.evaluate(compiled)
+        self.store_result(compiled, value)
+        return value
+
+    def calculate(self, user_input: str) -> float:
+        """
+        evaluates a (non-command) input and updates the variables, returns
+        the result
+        """
+
+        return self.apply(self.compile(user_input))
+
+    def define_function(self, compiled: CompiledExpression) -> Function:
+        """
+        Stores a compiled function definition. The functions it calls are
+        bound now, redefining them later does not change this function, so
+        calls can never go round in a circle. As the body only reads the
+        parameters, results are cached per argument tuple, the least recently
+        used are evicted past "memo_size" results.
+        """
+
+        functions = {}
+        for element in compiled.rpn:
+            if isinstance(element, FunctionCall):
+                resolve_function(self.functions, element.name, element.argc)
+                functions[element.name] = self.functions[element.name]
+
+        body, params = compiled, compiled.params
+        if (self.backend == 'codegen') and (body.func is None):
+            body = self.with_code(body)
+        memo = ExpressionCache(maxsize=self.memo_size)
+
+        def call(*args):
+            if not all(isinstance(arg, NUMBER_TYPES) for arg in args):
+                # e.g. arrays (see "evaluate_array")
+                return self.evaluate(body, dict(zip(params, args)), functions)
+
+            # repr keeps e.g. 0.0 and -0.0 or Decimal 2 and 2.0 apart, they
+            # compare equal
+            key = tuple((type(arg), repr(arg)) for arg in args)
+            value = memo.get(key)
+            if value is None:
+                value = self.evaluate(body, dict(zip(params, args)),
+                                      functions)
+                memo.put(key, value)
+            return value
+
+        function = Function(len(params), call, compiled, memo)
+        self.functions[compiled.var_name] = function
+        self.definitions[self._defined] = compiled
+        self._defined += 1
+        self._prune_definitions()
+        return function
+
+    def _prune_definitions(self) -> None:
+        """
+        drops the definitions no function can call any more, those replaced
+        by a later definition of the same name and not bound by a function
+        still in use. Going backwards, the first definition of a name is in
+        use and binds the last definitions before it of the names it calls.
+        """
+
+        wanted = {d.var_name for d in self.definitions.values()}
+        unused = []
+        for number, compiled in reversed(self.definitions.items()):
+            if compiled.var_name not in wanted:
+                unused.append(number)
+                continue
+            wanted.discard(compiled.var_name)
+            wanted.update(element.name for element in compiled.rpn
+                          if isinstance(element, FunctionCall))
+        for number in unused:
+            del self.definitions[number]
+
+    def function_stats(self) -> Dict[str, dict]:
+        """use of the result cache of each user function"""
+        return {name: {'hits': f.memo.hits, 'misses': f.memo.misses,
+                       'size': len(f.memo), 'maxsize': f.memo.maxsize}
+                for name, f in self.functions.items() if f.memo is not None}
+
+    def list_functions(self) -> str:
+        lines = ['\tbuilt-in: ' + ', '.join(BUILTIN_FUNCTIONS)]
+        for name, stats in self.function_stats().items():
+            calls = stats['hits'] + stats['misses']
+            hit_rate = stats['hits']/calls if calls else 0.0
+            lines.append(f'\t{self.functions[name].definition.source}\t'
+                         f'{calls} calls, {hit_rate:.0%} cached, '
+                         f'{stats["size"]}/{stats["maxsize"]} results kept')
+        return '\n'.join(lines)
+
+    def apply_formula(self, compiled: CompiledExpression) -> float:
+        """
+        Reactive mode assignment. The expression is stored as the variable's
+        formula and every variable depending on it, directly or indirectly,
+        is recomputed in topological order. Only the affected part of the
+        dependency graph is visited. "ans" is not tracked, it is replaced by
+        its current value when the formula is stored.
+        """
+
+        name = compiled.var_name
+
+        formula = compiled
+        if Variable('ans') in compiled.rpn:
+            ans = self.variables.get('ans')
+            if ans is None:
+                raise UnknownVariableError('Undeclared variable "ans"')
+            formula = compiled._replace(
+                rpn=tuple(ans if e == Variable('ans') else e
+                          for e in compiled.rpn),
+                func=None, fast=None)
+        if self.backend == 'codegen':
+            formula = self.with_code(formula)
+
+        reads = {e.name for e in formula.rpn if isinstance(e, Variable)}
+        self._check_cycle(name, reads)
+
+        value = self.evaluate(formula)  # nothing is changed if this fails
+        self.store_result(compiled, value)
+
+        self._link(name, reads)
+        self.formulas[name] = formula
+
+        self._recompute_dependents(name)
+        return value
+
+    def _link(self, name: str, reads: Set[str]) -> None:
+        """makes "reads" the variables the formula of "name" depends on"""
+        for read in self.dependencies.get(name, ()):
+            self.dependents[read].discard(name)
+        for read in reads:
+            self.dependents.setdefault(read, set()).add(name)
+        self.dependencies[name] = reads
+
+    def _check_cycle(self, name: str, reads: Set[str]) -> None:
+        """
+        raises CircularReferenceError if "name" would read itself, directly
+        or through a variable depending on it. Searches downstream from
+        "name", so a new variable (e.g. the next link of a chain) costs
+        nothing whatever it reads.
+        """
+
+        error = CircularReferenceError(f'"{name}" would depend on itself')
+        if name in reads:
+            raise error
+
+        seen, stack = {name}, [name]
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent in reads:
+                    raise error
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append(dependent)
+
+    def _recompute_dependents(self, name: str) -> None:
+
+        # everything downstream of the changed variable
+        affected, stack = set(), [name]
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    stack.append(dependent)
+
+        # Kahn's algorithm restricted to the affected variables
+        waiting_on = {var: len(self.dependencies[var] & affected)
+                      for var in affected}
+        ready = deque(var for var, n in waiting_on.items() if n == 0)
+        failed = []
+
+        while ready:
+            var = ready.popleft()
+            try:
+                formula = self.formulas[var]
+                if (self.backend == 'codegen') and (formula.func is None):
+                    # restored from a workspace, code is generated on use
+                    formula = self.formulas[var] = self.with_code(formula)
+                self.variables[var] = self.evaluate(formula)
+            except (CalculatorBaseError, ArithmeticError) as err:
+                self.variables.pop(var, None)  # its dependents fail as well
+                failed.append(f'{var} ({err})')
+
+            for dependent in self.dependents.get(var, ()):
+                if dependent in affected:
+                    waiting_on[dependent] -= 1
+                    if waiting_on[dependent] == 0:
+                        ready.append(dependent)
+
+        if failed:
+            raise RecomputeError('Could not recompute ' + ', '.join(failed))
+
+    # workspace files: header (magic, version, numeric mode, CRC-32 of the
+    # rest), then five sections each prefixed with its length in bytes: the
+    # names of the float variables, their values (doubles), the other
+    # variables, the formulas and the function definitions in order
+    _WORKSPACE_HEADER = struct.Struct('<4sHBI')
+    _WORKSPACE_SECTION = struct.Struct('<I')
+    _WORKSPACE_MAGIC = b'CALC'
+    _WORKSPACE_VERSION = 1
+
+    def save_workspace(self, path: str) -> None:
+        """
+        Writes the variables, the formulas (reactive mode) and the function
+        definitions to a binary file. Formulas and functions are stored as
+        their rpn, variables holding floats as one block of doubles, so
+        "load_workspace" restores all of them without parsing any input.
+        """
+
+        names, values, others = [], array('d'), []
+        for name, value in self.variables.items():
+            if type(value) is float:
+                names.append(name)
+                values.append(value)
+            else:
+                others.append(f'{name}\t{encode_element(value)}')
+        if sys.byteorder == 'big':  # file is always little endian
+            values.byteswap()
+
+        def rpn_text(rpn: tuple) -> str:
+            return ' '.join(map(encode_element, rpn))
+
+        formulas = [f'{name}\t{rpn_text(f.rpn)}\t{f.source}'
+                    for name, f in self.formulas.items()]
+        definitions = [f'{d.var_name}\t{",".join(d.params)}\t'
+                       f'{rpn_text(d.rpn)}\t{d.source}'
+                       for d in self.definitions.values()]
+
+        sections = ['\n'.join(names).encode(), values.tobytes(),
+                    '\n'.join(others).encode(), '\n'.join(formulas).encode(),
+                    '\n'.join(definitions).encode()]
+        body = b''.join(self._WORKSPACE_SECTION.pack(len(section)) + section
+                        for section in sections)
+        header = self._WORKSPACE_HEADER.pack(
+            self._WORKSPACE_MAGIC, self._WORKSPACE_VERSION,
+            self.numeric_modes.index(self.numeric), zlib.crc32(body))
+
+        try:
+            with open(path, 'wb') as file:
+                file.write(header + body)
+        except OSError as err:
+            raise WorkspaceError(f'Could not write {path} ({err.strerror})')
+
+    def load_workspace(self, path: str) -> None:
+        """
+        Replaces the variables, formulas and functions with those saved by
+        "save_workspace". The file is read in one go and checked before
+        anything is changed. Values are restored as saved, nothing is
+        evaluated, and formulas get their generated code once recomputed.
+        Formulas are only kept in reactive mode.
+        """
+
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError as err:
+            raise WorkspaceError(f'Could not read {path} ({err.strerror})')
+
+        header = self._WORKSPACE_HEADER
+        try:
+            magic, version, mode, checksum = header.unpack_from(data)
+        except struct.error:  # shorter than a header
+            magic = version = None
+        if (magic != self._WORKSPACE_MAGIC) or (
+                version != self._WORKSPACE_VERSION):
+            raise WorkspaceError(f'{path} is not a calculator workspace '
+                                 f'(version {self._WORKSPACE_VERSION})')
+        if zlib.crc32(data[header.size:]) != checksum:
+            raise WorkspaceError(f'{path} is damaged')
+        if mode != self.numeric_modes.index(self.numeric):
+            saved = (self.numeric_modes[mode]
+                     if mode < len(self.numeric_modes) else 'unknown')
+            raise WorkspaceError(f'{path} holds {saved} numbers, not '
+                                 f'{self.numeric}')
+
+        try:
+            variables, formulas, definitions = self._decode_workspace(
+                data, header.size)
+        except (ArithmeticError, IndexError, KeyError, ValueError,
+                struct.error):  # damaged despite the checksum
+            raise WorkspaceError(f'{path} is damaged') from None
+
+        self.clear_variables()
+        self.reset_functions()
+        self.variables.update(variables)
+        for compiled in definitions:
+            self.define_function(compiled)
+        if self.reactive:
+            for name, formula in formulas.items():
+                self.formulas[name] = formula
+                self._link(name, {e.name for e in formula.rpn
+                                  if isinstance(e, Variable)})
+
+    def _decode_workspace(self, data: bytes, offset: int) -> tuple:
+        """the variables, formulas and function definitions of a workspace
+        file's sections, starting at "offset" """
+
+        sections = []
+        for _ in range(5):
+            (size,) = self._WORKSPACE_SECTION.unpack_from(data, offset)
+            offset += self._WORKSPACE_SECTION.size
+            sections.append(data[offset:offset + size])
+            offset += size
+        if offset != len(data):
+            raise ValueError('unexpected data after the last section')
+
+        def lines(section: bytes) -> list:
+            return section.decode().split('\n') if section else []
+
+        def rpn(text: str) -> tuple:
+            elements = tuple(map(decode_element, text.split(' ')))
+            for element in elements:
+                if isinstance(element, str) and (element
+                                                 not in self.operators):
+                    raise ValueError(f'unknown operator "{element}"')
+            return elements
+
+        names = lines(sections[0])
+        values = array('d')
+        values.frombytes(sections[1])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        if len(names) != len(values):
+            raise ValueError('names and values do not match')
+
+        variables = dict(zip(names, values.tolist()))
+        for line in lines(sections[2]):
+            name, value = line.split('\t')
+            variables[name] = decode_element(value)
+
+        formulas = {}
+        for line in lines(sections[3]):
+            name, text, source = line.split('\t', 2)
+            elements = rpn(text)
+            formulas[name] = CompiledExpression(
+                source, name, elements, None, count_operations(elements),
+                None, None)
+
+        definitions = []
+        for line in lines(sections[4]):
+            name, params, text, source = line.split('\t', 3)
+            elements = rpn(text)
+            definitions.append(CompiledExpression(
+                source, name, elements, None, count_operations(elements),
+                tuple(params.split(',')) if params else (), None))
+
+        return variables, formulas, definitions
+
+    @staticmethod
+    def format_result(value: float) -> str:
+        if isinstance(value, Function):  # a function definition
+            definition = value.definition
+            return (f'\t{definition.var_name}({",".join(definition.params)})'
+                    ' defined')
+        return f"\t= {value}"
+
     def process_input(self, user_input: str) -> None:
 
         if user_input == "":
@@ -228,33 +1686,171 @@ class Calculator():
             self.run_command(user_input)
             return None
 
-        self.expression = self.parse_input(user_input)
+        print(self.format_result(self.calculate(user_input)))
 
-        # check for an assignment
-        if '=' in self.expression:
-            var_name = self.pop_var_name()
-        else:
-            var_name = None
+    def _batch_read(self, lines: Iterable[str]) -> Iterator[tuple]:
+        for line_number, line in enumerate(lines, start=1):
+            user_input = self.santitize_input(line)
+            if user_input:
+                yield line_number, user_input
 
-        # check leading +/- signs
-        if self.expression[0] in self.operators:
-            val = self.operators[self.expression[0]].leading_value
-            if val is not None:
-                self.expression.appendleft(val)
-            else:
-                raise InvalidExpressionError("Missing operands")
+    def _batch_compile(self, numbered_inputs: Iterable[tuple]
+                       ) -> Iterator[tuple]:
+        for line_number, user_input in numbered_inputs:
+            if user_input.startswith('\\'):  # commands are not compiled
+                yield line_number, user_input, None
+                continue
+            try:
+                yield line_number, user_input, self.compile(user_input)
+            except Exception as err:  # reported by "_batch_evaluate"
+                yield line_number, user_input, err
 
-        self.convert_expression_to_rpn()
+    def _batch_evaluate(self, compiled_inputs: Iterable[tuple]
+                        ) -> Iterator[str]:
+        for line_number, user_input, compiled in compiled_inputs:
+            try:
+                if isinstance(compiled, Exception):
+                    raise compiled
+
+                if compiled is None:
+                    if user_input == r'\exit':
+                        return
+                    yield self.execute_command(user_input)
+                    continue
+
+                yield self.format_result(self.apply(compiled))
+
+            except Exception as err:  # any error only fails its own line
+                yield f'\t line {line_number}: {err}'
+
+    def process_batch(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Lazily evaluates a stream of input lines as if each had been typed
+        into the interactive session, yielding one output line per input.
+        The lines pass through a chain of generators (read, compile,
+        evaluate) one at a time, so memory use does not depend on the number
+        of lines. An error is reported for its line and the stream goes on.
+        """
+
+        return self.process_batch_numbered(self._batch_read(lines))
+
+    def process_batch_numbered(self, numbered_inputs: Iterable[tuple]
+                               ) -> Iterator[str]:
+        """"process_batch" for (line number, sanitized input) pairs"""
+        return self._batch_evaluate(self._batch_compile(numbered_inputs))
+
+    # lines reading "ans" or changing the variables ("=", commands) have to
+    # be evaluated in order, any other line only depends on the variables
+    _ans_reference = re.compile(r'(?<![a-zA-Z])ans(?![a-zA-Z])')
+
+    def is_independent(self, user_input: str) -> bool:
+        """
+        checks whether a (sanitized) input line can be evaluated without the
+        results of the lines before it: it is not a command, not an
+        assignment (see "pop_var_name") and does not read "ans"
+        """
+
+        return not (user_input.startswith('\\') or ('=' in user_input)
+                    or self._ans_reference.search(user_input))
+
+    def _worker_settings(self) -> dict:
+        """arguments to build an equivalent Calculator in a worker process"""
+        return {'backend': self.backend, 'budget': self.budget,
+                'memo_size': self.memo_size, 'numeric': self.numeric,
+                'precision': self.precision}
+
+    def process_batch_parallel(self, lines: Iterable[str],
+                               workers: Optional[int] = None,
+                               chunk_lines: int = 2048,
+                               max_pending: Optional[int] = None
+                               ) -> Iterator[str]:
+        """
+        Same output as "process_batch", but runs of independent lines (see
+        "is_independent") are split into chunks which are evaluated in a
+        process pool against a copy of the variables. Any other line waits
+        for the chunks before it and is evaluated here, in order. At most
+        "max_pending" chunks are in flight and results are yielded in input
+        order. Function definitions are repeated in the workers.
+        """
 
-        self.variables['ans'] = self.calculate_expression()  # save last answer
-        print(f"\t= {self.variables['ans']}")
+        workers = workers or os.cpu_count() or 1
+        max_pending = max_pending or 2*workers
+        pending, chunk = deque(), []
+
+        def submit(chunk: list):
+            return pool.submit(_evaluate_chunk, dict(self.variables),
+                               tuple((number, d.source) for number, d
+                                     in self.definitions.items()),
+                               chunk)
+
+        def chunk_results(future) -> Iterator[str]:
+            outputs, ans = future.result()
+            if ans is not None:  # at least one line of the chunk succeeded
+                self.variables['ans'] = ans
+            yield from outputs
+
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_init_batch_worker,
+                                 initargs=(self._worker_settings(),)) as pool:
+
+            for line_number, user_input in self._batch_read(lines):
+
+                if self.is_independent(user_input):
+                    chunk.append((line_number, user_input))
+                    if len(chunk) >= chunk_lines:
+                        pending.append(submit(chunk))
+                        chunk = []
+                    while len(pending) > max_pending:
+                        yield from chunk_results(pending.popleft())
+                    continue
 
-        if var_name:
-            self.variables[var_name] = self.variables['ans']
+                # dependent line, everything before it has to be finished
+                if chunk:
+                    pending.append(submit(chunk))
+                    chunk = []
+                while pending:
+                    yield from chunk_results(pending.popleft())
+
+                if user_input == r'\exit':
+                    return
+                yield from self.process_batch_numbered(
+                    [(line_number, user_input)])
+
+            if chunk:
+                pending.append(submit(chunk))
+            while pending:
+                yield from chunk_results(pending.popleft())
+
+    def run_batch(self, lines: Iterable[str], out: TextIO = sys.stdout,
+                  buffer_lines: int = 4096,
+                  workers: Optional[int] = None) -> None:
+        """
+        writes the results of "process_batch" to "out" in blocks, or those of
+        "process_batch_parallel" if more than one worker is requested
+        """
+
+        if (workers is not None) and (workers > 1):
+            results = self.process_batch_parallel(lines, workers=workers)
+        else:
+            results = self.process_batch(lines)
+
+        buffer = []
+        try:
+            for result in results:
+                buffer.append(result)
+                if len(buffer) >= buffer_lines:
+                    out.write('\n'.join(buffer) + '\n')
+                    buffer.clear()
+        finally:  # results already computed are not lost on an error
+            if buffer:
+                out.write('\n'.join(buffer) + '\n')
+            out.flush()
 
     @ staticmethod
     def santitize_input(user_input: str) -> str:
         processed_input = user_input.strip()
+        if processed_input.startswith('\\'):  # keep a command's argument
+            return ' '.join(processed_input.split(maxsplit=1))
         return processed_input.replace(' ', '')
 
     def start_session(self) -> None:
@@ -264,10 +1860,51 @@ class Calculator():
                 user_input = self.santitize_input(input())
                 self.process_input(user_input)
 
-            except CalculatorBaseError as err:
+            except (CalculatorBaseError, ArithmeticError) as err:
                 print(f'\t {err}')
 
 
+_worker_calculator = None
+_worker_defined = 0  # definitions of the main calculator repeated so far
+
+
+def _init_batch_worker(settings: dict) -> None:
+    global _worker_calculator
+    _worker_calculator = Calculator(**settings)
+
+
+def _evaluate_chunk(variables: dict, definitions: tuple,
+                    numbered_inputs: list) -> tuple:
+    """
+    evaluates a chunk of independent lines in a worker process, returns their
+    output and the final value of "ans" (None if no line succeeded).
+    "definitions" are the (number, source) pairs of the function
+    definitions in use (see "Calculator.definitions"). The worker only
+    repeats those made since its last chunk, which drops the same unused
+    definitions, or all of them if the functions were reset (see
+    "Calculator.load_workspace").
+    """
+
+    global _worker_defined
+    calc = _worker_calculator
+    for number, source in definitions:
+        if number >= _worker_defined:
+            calc.define_function(calc.compile(source))
+    sources = [source for _, source in definitions]
+    if [d.source for d in calc.definitions.values()] != sources:
+        calc.reset_functions()
+        for source in sources:
+            calc.define_function(calc.compile(source))
+    if definitions:
+        _worker_defined = max(_worker_defined, definitions[-1][0] + 1)
+
+    calc.variables = variables
+    variables.pop('ans', None)  # never read, only set by successful lines
+
+    outputs = list(calc.process_batch_numbered(numbered_inputs))
+    return outputs, calc.variables.get('ans')
+
+
 class CalculatorBaseError(Exception):
     def __init__(self, message="Unknown variable", *args: object) -> None:
         super().__init__(message, *args)
@@ -293,7 +1930,64 @@ class UnknownCommandError(CalculatorBaseError):
         super().__init__(message, *args)
 
 
+class CircularReferenceError(CalculatorBaseError):
+    def __init__(self, message="Circular reference", *args: object) -> None:
+        super().__init__(message, *args)
+
+
+class RecomputeError(CalculatorBaseError):
+    def __init__(self, message="Could not recompute", *args: object) -> None:
+        super().__init__(message, *args)
+
+
+class UnknownFunctionError(CalculatorBaseError):
+    def __init__(self, message="Unknown function", *args: object) -> None:
+        super().__init__(message, *args)
+
+
+class BudgetExceededError(CalculatorBaseError):
+    def __init__(self, message="Evaluation budget exceeded",
+                 *args: object) -> None:
+        super().__init__(message, *args)
+
+
+class WorkspaceError(CalculatorBaseError):
+    def __init__(self, message="Invalid workspace", *args: object) -> None:
+        super().__init__(message, *args)
+
+
 if __name__ == '__main__':
 
-    calc = Calculator()
-    calc.start_session()
+    parser = argparse.ArgumentParser(description='Smart calculator')
+    parser.add_argument('-b', '--batch', metavar='FILE', default=None,
+                        help='evaluate every line of FILE ("-" for stdin) '
+                        'instead of starting an interactive session')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='evaluate independent batch lines in this many '
+                        'processes')
+    parser.add_argument('-r', '--reactive', action='store_true',
+                        help='keep assignments as formulas which update when '
+                        'the variables they use change')
+    parser.add_argument('-n', '--numeric', default='float',
+                        choices=Calculator.numeric_modes,
+                        help='number type, exact fractions or decimals '
+                        'rounded to --precision digits')
+    parser.add_argument('-p', '--precision', type=int, default=28)
+    parser.add_argument('-l', '--load', metavar='FILE', default=None,
+                        help='start from a workspace saved with \\save')
+    args = parser.parse_args()
+
+    calc = Calculator(reactive=args.reactive, numeric=args.numeric,
+                      precision=args.precision)
+    if args.load is not None:
+        try:
+            calc.load_workspace(args.load)
+        except WorkspaceError as err:
+            parser.error(str(err))
+    if args.batch is None:
+        calc.start_session()
+    elif args.batch == '-':
+        calc.run_batch(sys.stdin, workers=args.workers)
+    else:
+        with open(args.batch, buffering=1 << 20) as file:
+            calc.run_batch(file, workers=args.workers)
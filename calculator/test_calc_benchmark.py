@@ -0,0 +1,35 @@
+import random
+import unittest
+from calc_benchmark import generate_expression, run_case, variable_names
+from smart_calc import Calculator
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_variable_names(self):
+        names = variable_names(800)
+        self.assertEqual(names[:3], ['a', 'b', 'c'])
+        self.assertEqual(names[25:28], ['z', 'aa', 'ab'])
+        self.assertEqual(len(set(names)), 800)
+        self.assertNotIn('ans', names)
+        self.assertTrue(all(name.isalpha() for name in names))
+
+    def test_generated_expressions_compile(self):
+        rng = random.Random(0)
+        calc = Calculator()
+        for depth in (0, 3):
+            source = generate_expression(rng, 50, depth, '+-*/^', ('x',))
+            self.assertEqual(source.count('('), depth)
+            self.assertEqual(len(calc.parse_input(source))
+                             - 2*depth, 2*50 - 1)
+
+    def test_run_case(self):
+        result = run_case('test', length=20, expressions=3, repeat=2)
+        self.assertEqual(result['name'], 'test')
+        self.assertEqual(result['stages']['calculate_expression']['calls'],
+                         3*2)
+        self.assertGreater(result['rpn_tokens'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
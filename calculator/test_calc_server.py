@@ -0,0 +1,109 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from calc_server import MAX_LINE, SERVER_BUDGET, CalculatorServer
+
+
+class RespondTest(unittest.TestCase):
+
+    def test_responses(self):
+        server = CalculatorServer()
+        calc = server.new_session()
+        respond = server.respond
+
+        self.assertEqual(respond(calc, 'x = 2\n'), '\t= 2.0')
+        self.assertEqual(respond(calc, 'x*3\n'), '\t= 6.0')
+        self.assertEqual(respond(calc, '\n'), '')
+        self.assertEqual(respond(calc, '1/0\n'),
+                         '\t float division by zero')
+        self.assertEqual(respond(calc, 'y\n'), '\t Undeclared variable "y"')
+        self.assertEqual(respond(calc, r'\clear'), 'Variables Erased')
+        self.assertNotIn('\n', respond(calc, r'\help'))
+        self.assertEqual(respond(calc, r'\nope'),
+                         '\t Unsupported command: \\nope')
+        self.assertIsNone(respond(calc, '\\exit\n'))
+
+    def test_sessions_are_limited(self):
+        server = CalculatorServer()
+        calc = server.new_session()
+        self.assertEqual(calc.budget, SERVER_BUDGET)
+        for command in ('\\save', '\\load'):
+            self.assertEqual(server.respond(calc, command + ' x.calc'),
+                             f'\t Unsupported command: {command} x.calc')
+        self.assertIn('digits', server.respond(calc, '10^2000'))
+
+    def test_any_error_is_answered(self):
+        def fail(x):
+            raise RuntimeError('boom')
+
+        server = CalculatorServer()
+        calc = server.new_session()
+        calc.functions['fail'] = calc.functions['abs']._replace(eval=fail)
+        self.assertEqual(server.respond(calc, 'fail(1)'), '\t boom')
+        self.assertEqual(server.respond(calc, '1+1'), '\t= 2.0')
+
+    def test_sessions_share_the_cache(self):
+        server = CalculatorServer()
+        first, second = server.new_session(), server.new_session()
+        server.respond(first, 'x=1')
+        server.respond(second, 'x=2')
+
+        self.assertEqual(server.respond(first, 'x+1'), '\t= 2.0')
+        self.assertEqual(server.respond(second, 'x+1'), '\t= 3.0')
+        self.assertIs(first.cache, second.cache)
+        self.assertIn('x+1', server.cache)
+
+
+@unittest.skipUnless(hasattr(asyncio, 'start_unix_server'),
+                     'requires Unix sockets')
+class ConnectionTest(unittest.TestCase):
+
+    def exchange(self, server, client_lines, limit=MAX_LINE):
+        """sends each client's lines over its own connection, returns the
+        responses until each connection was closed"""
+
+        async def client(path, lines):
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b''.join(lines))
+            await writer.drain()
+            responses = (await reader.read()).decode().splitlines()
+            writer.close()
+            return responses
+
+        async def run(path):
+            listener = await asyncio.start_unix_server(server.handle_client,
+                                                       path=path, limit=limit)
+            async with listener:
+                return await asyncio.gather(*(client(path, lines)
+                                              for lines in client_lines))
+
+        with tempfile.TemporaryDirectory() as directory:
+            return asyncio.run(run(os.path.join(directory, 'calc.sock')))
+
+    def test_clients_have_their_own_variables(self):
+        responses = self.exchange(CalculatorServer(), [
+            [b'x=1\n', b'x+1\n', b'\\exit\n', b'x\n'],
+            [b'x=5\n', b'x+1\n', b'\\exit\n']])
+
+        self.assertEqual(responses, [['\t= 1.0', '\t= 2.0', 'Bye!'],
+                                     ['\t= 5.0', '\t= 6.0', 'Bye!']])
+
+    def test_bad_lines_are_answered(self):
+        responses = self.exchange(CalculatorServer(), [
+            [b'1+\xff\n', b'x' * (2*MAX_LINE) + b'\n', b'2+2\n',
+             b'\\exit\n']])
+        self.assertEqual(responses, [['\t Input error at position 2',
+                                      '\t Line too long', '\t= 4.0',
+                                      'Bye!']])
+
+    def test_long_line_is_answered_once(self):
+        # more than the reader buffers, the line arrives in several reads
+        responses = self.exchange(CalculatorServer(), [
+            [b'1+' * (100*MAX_LINE) + b'1\n', b'2+2\n', b'\\exit\n']])
+        self.assertEqual(responses, [['\t Line too long', '\t= 4.0',
+                                      'Bye!']])
+
+
+if __name__ == '__main__':
+    unittest.main()
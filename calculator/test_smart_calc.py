@@ -0,0 +1,807 @@
+from decimal import Decimal
+from fractions import Fraction
+import io
+import os
+import random
+import tempfile
+import time
+import unittest
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from smart_calc import (BudgetExceededError, Calculator,
+                        CircularReferenceError, DEFAULT_BUDGET,
+                        EvaluationBudget, ExpressionCache, Function,
+                        FunctionCall, InvalidExpressionError,
+                        InvalidVariableError, RecomputeError, StageProfiler,
+                        Token, UnknownFunctionError, UnknownVariableError,
+                        Variable, WorkspaceError)
+
+
+def outcome(func, *args) -> str:
+    """the result of func(*args) as text, or the name of the error raised"""
+    try:
+        return str(func(*args))
+    except Exception as err:
+        return type(err).__name__
+
+
+def random_expression(rng: random.Random, depth: int, names=('x', 'y'),
+                      ops: str = '+-*/^', integers: bool = False) -> str:
+    if (depth == 0) or (rng.random() < 0.2):
+        numbers = [str(rng.randint(0, 9))]
+        if not integers:
+            numbers.append(f'{rng.random()*4:.2f}')
+        return rng.choice(numbers + [rng.choice(names)])
+
+    a = random_expression(rng, depth - 1, names, ops, integers)
+    b = random_expression(rng, depth - 1, names, ops, integers)
+    expression = f'{a}{rng.choice(ops)}{b}'
+    return f'({expression})' if rng.random() < 0.5 else expression
+
+
+def random_expressions(n: int, seed: int = 0, **options) -> list:
+    rng = random.Random(seed)
+    return [random_expression(rng, rng.randint(1, 4), **options)
+            for _ in range(n)]
+
+
+def calculate(calc: Calculator, source: str):
+    return calc.evaluate(calc.compile(source))
+
+
+class TokenizerTest(unittest.TestCase):
+
+    def test_kinds_and_positions(self):
+        tokens = list(Calculator().tokenize('ab=(1.5+.25)^x'))
+        self.assertEqual(tokens, [Token('var', 'ab', 0), Token('op', '=', 2),
+                                  Token('sep', '(', 3),
+                                  Token('arg', '1.5', 4),
+                                  Token('op', '+', 7),
+                                  Token('arg', '.25', 8),
+                                  Token('sep', ')', 11),
+                                  Token('op', '^', 12),
+                                  Token('var', 'x', 13)])
+
+    def test_numbers(self):
+        for text in ('12', '3.', '3.25', '.5'):
+            with self.subTest(text=text):
+                self.assertEqual(list(Calculator().tokenize(text)),
+                                 [Token('arg', text, 0)])
+
+    def test_invalid_input(self):
+        with self.assertRaisesRegex(InvalidExpressionError, 'position 2'):
+            list(Calculator().tokenize('1+$'))
+
+    def test_parse_input(self):
+        self.assertEqual(list(Calculator().parse_input('2--3*(.5)')),
+                         [2.0, '+', 3.0, '*', '(', 0.5, ')'])
+
+
+class ExpressionCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ExpressionCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)  # 'b' is now the oldest
+
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('b', cache)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_compiled_once(self):
+        calc = Calculator(backend='interpreter')
+        compiled = calc.compile('x*2+1')
+        self.assertIs(calc.compile('x*2+1'), compiled)
+        self.assertEqual(calc.cache.hits, 1)
+
+        self.assertRaises(UnknownVariableError, calc.evaluate, compiled)
+        for x in (1.0, 4.0):  # variables are resolved on evaluation
+            calc.variables['x'] = x
+            self.assertEqual(calc.evaluate(compiled), 2*x + 1)
+
+    def test_shared_cache(self):
+        cache = ExpressionCache()
+        first, second = (Calculator(cache=cache, backend='interpreter')
+                         for _ in range(2))
+        self.assertIs(first.compile('1+2'), second.compile('1+2'))
+
+
+class BackendTest(unittest.TestCase):
+
+    """generated code has to give the same results (and errors) as the
+    interpreter"""
+
+    def check_backends(self, numeric, expressions, variables):
+        codegen = Calculator(backend='codegen', numeric=numeric)
+        interpreter = Calculator(backend='interpreter', numeric=numeric)
+        for calc in (codegen, interpreter):
+            calc.variables.update({name: calc.number(str(value))
+                                   for name, value in variables.items()})
+
+        for source in expressions:
+            codegen.compile(source)  # code is generated on the second use
+            with self.subTest(numeric=numeric, source=source):
+                self.assertEqual(outcome(calculate, codegen, source),
+                                 outcome(calculate, interpreter, source))
+
+    def test_code_is_generated(self):
+        calc = Calculator(backend='codegen')
+        self.assertIsNone(calc.compile('x*2+1').func)  # used once so far
+        self.assertIsNotNone(calc.compile('x*2+1').func)
+        calc.compile('x*2+')
+        self.assertIsNone(calc.compile('x*2+').func)  # malformed
+        self.assertIsNone(Calculator(backend='interpreter').compile('x*2+1')
+                          .func)
+        self.assertRaises(ValueError, Calculator, backend='other')
+
+    def test_random_expressions(self):
+        expressions = (random_expressions(300, seed=1)
+                       + random_expressions(300, seed=2, integers=True))
+        for numeric in Calculator.numeric_modes:
+            for x, y in ((0.5, 3), (0, -2)):
+                self.check_backends(numeric, expressions, {'x': x, 'y': y})
+
+    def test_special_cases(self):
+        expressions = ['0^0', 'x^0', 'x*(0-1)', '1/x', '(0-1)^0.5',
+                       '2^0.5', '9^9^9', '-x^2', '2^(0-1)', 'undefined+1',
+                       'z+', 'x+', '1/0+', 'sqrt()']
+        for numeric in Calculator.numeric_modes:
+            self.check_backends(numeric, expressions, {'x': 0})
+
+
+class ConstantFoldingTest(unittest.TestCase):
+
+    def rpn(self, source):
+        return Calculator(backend='interpreter').compile(source).rpn
+
+    def test_folds_constant_subexpressions(self):
+        x = Variable('x')
+        self.assertEqual(self.rpn('2*3+x'), (6.0, x, '+'))
+        self.assertEqual(self.rpn('x+2*3^2'), (x, 18.0, '+'))
+        self.assertEqual(self.rpn('(1+2)*(x+(3-1))'),
+                         (3.0, x, 2.0, '+', '*'))
+
+    def test_keeps_order_and_grouping(self):
+        x = Variable('x')
+        self.assertEqual(self.rpn('x+1+2'), (x, 1.0, '+', 2.0, '+'))
+        self.assertEqual(self.rpn('2^x^2'), (2.0, x, 2.0, '^', '^'))
+
+    def test_leaves_failing_operations(self):
+        calc = Calculator(backend='interpreter')
+        self.assertEqual(calc.compile('1/0').rpn, (1.0, 0.0, '/'))
+        self.assertRaises(ZeroDivisionError, calculate, calc, '1/0')
+        self.assertEqual(calc.compile('2*').rpn, (2.0, '*'))  # malformed
+        self.assertEqual(calculate(calc, '(0-1)^0.5+1'), (-1)**0.5 + 1)
+
+    def test_folds_builtin_calls_only(self):
+        self.assertEqual(self.rpn('sqrt(4)*x'), (2.0, Variable('x'), '*'))
+
+        calc = Calculator(backend='interpreter')
+        calc.calculate('g(a)=a+1')  # only known when evaluated
+        self.assertEqual(calc.compile('g(2)').rpn,
+                         (2.0, FunctionCall('g', 1)))
+
+    def test_same_results_as_unfolded(self):
+        expressions = random_expressions(300, seed=3)
+        for numeric in Calculator.numeric_modes:
+            folded = Calculator(backend='interpreter', numeric=numeric)
+            unfolded = Calculator(backend='interpreter', numeric=numeric)
+            unfolded.fold_constants = lambda rpn, deadline: rpn
+            for calc in (folded, unfolded):
+                calc.variables['x'] = calc.number('1.5')
+
+            for source in expressions:
+                with self.subTest(numeric=numeric, source=source):
+                    self.assertEqual(outcome(calculate, folded, source),
+                                     outcome(calculate, unfolded, source))
+
+    def test_repeated_subexpressions_computed_once(self):
+        calls = []
+        calc = Calculator(backend='codegen')
+        calc.operators['*'] = calc.operators['*']._replace(
+            eval=lambda a, b: calls.append((a, b)) or a*b)
+        calc.variables.update({'x': 2.0, 'y': 3.0})
+
+        calc.compile('x*y+x*y-(x*y)')  # code is generated on the second use
+        self.assertEqual(calculate(calc, 'x*y+x*y-(x*y)'), 6.0)
+        self.assertEqual(calls, [(2.0, 3.0)])
+
+
+@unittest.skipIf(np is None, 'requires NumPy')
+class ArrayTest(unittest.TestCase):
+
+    def test_same_results_as_scalars(self):
+        calc = Calculator()
+        calc.variables['y'] = 2.0
+        xs = [0.5, 1.0, 3.0]
+        result = calc.evaluate_array('x*y-x^2/(1+x)', {'x': xs})
+
+        self.assertEqual(result.shape, (3,))
+        for x, value in zip(xs, result):
+            calc.variables['x'] = x
+            self.assertAlmostEqual(value, calculate(calc, 'x*y-x^2/(1+x)'))
+
+    def test_broadcasting(self):
+        result = Calculator().evaluate_array('x*10+y', {'x': [[1], [2]],
+                                                        'y': [1, 2, 3]})
+        self.assertEqual(result.tolist(), [[11, 12, 13], [21, 22, 23]])
+        self.assertEqual(Calculator().evaluate_array('2*3', {'x': [1, 2]})
+                         .tolist(), [6, 6])
+
+    def test_invalid_input(self):
+        calc = Calculator()
+        self.assertTrue(np.isinf(calc.evaluate_array('1/x', {'x': [0]})[0]))
+        calc.variables['y'] = 0.0
+        for source in ('x+1/0', 'x+1/y', 'x*(0/y)'):
+            with self.subTest(source=source):
+                result = calc.evaluate_array(source, {'x': [1, 2]})
+                self.assertFalse(np.isfinite(result).any())
+        self.assertRaises(InvalidExpressionError, calc.evaluate_array,
+                          'y=x+1', {'x': [1]})
+
+
+class BatchTest(unittest.TestCase):
+
+    def test_one_output_per_line(self):
+        lines = ['x=2', '', '  x * 3 ', '1/0', '2*', r'\clear', 'x',
+                 r'\exit', '5']
+        self.assertEqual(list(Calculator().process_batch(lines)),
+                         ['\t= 2.0', '\t= 6.0', '\t line 4: float division '
+                          'by zero', '\t line 5: Missing operands',
+                          'Variables Erased',
+                          '\t line 7: Undeclared variable "x"'])
+
+    def test_lines_are_read_lazily(self):
+        def lines():
+            yield '1+1'
+            raise AssertionError('read past the first result')
+
+        self.assertEqual(next(Calculator().process_batch(lines())),
+                         '\t= 2.0')
+
+    def test_run_batch(self):
+        out = io.StringIO()
+        Calculator().run_batch((f'{i}*2' for i in range(5)), out,
+                               buffer_lines=2)
+        self.assertEqual(out.getvalue().splitlines(),
+                         [f'\t= {2.0*i}' for i in range(5)])
+
+
+    def test_unexpected_errors_fail_their_line(self):
+        def fail(x):
+            raise RuntimeError('boom')
+
+        calc = Calculator()
+        calc.functions['fail'] = Function(1, fail, None, None)
+        output = list(calc.process_batch(['1+1', 'fail(1)', '2+2']))
+        self.assertEqual(output, ['\t= 2.0', '\t line 2: boom', '\t= 4.0'])
+
+    def test_results_are_written_before_an_error(self):
+        def lines():
+            yield '1+1'
+            raise OSError('read error')
+
+        out = io.StringIO()
+        with self.assertRaises(OSError):
+            Calculator().run_batch(lines(), out)
+        self.assertEqual(out.getvalue(), '\t= 2.0\n')
+
+    def test_independent_lines(self):
+        calc = Calculator()
+        for line in ('x*2', '1/0', 'x+banana'):
+            self.assertTrue(calc.is_independent(line))
+        for line in ('x=2', 'ans*2', '2+ans', r'\clear'):
+            self.assertFalse(calc.is_independent(line))
+
+    def test_parallel_matches_sequential(self):
+        rng = random.Random(4)
+        lines = []
+        for i, source in enumerate(random_expressions(600, seed=4)):
+            lines.append(source)
+            if i % 50 == 0:
+                lines.extend([f'x={rng.randint(0, 9)}', 'y=ans*2', 'x*y-ans'])
+            if i % 170 == 0:
+                lines.extend([r'\clear', 'x=1', 'y=2', '1/0', 'z+'])
+
+        sequential, parallel = Calculator(), Calculator()
+        self.assertEqual(list(parallel.process_batch_parallel(
+                             lines, workers=2, chunk_lines=16)),
+                         list(sequential.process_batch(lines)))
+        self.assertEqual(parallel.variables, sequential.variables)
+
+
+class ReactiveTest(unittest.TestCase):
+
+    def test_dependents_are_recomputed(self):
+        calc = Calculator(reactive=True)
+        for line in ('a=1', 'b=a*2', 'c=b+a', 'd=c*c'):
+            calc.calculate(line)
+
+        calc.calculate('a=5')
+        self.assertEqual([calc.variables[v] for v in 'abcd'],
+                         [5.0, 10.0, 15.0, 225.0])
+
+        calc.calculate('b=1')  # b no longer depends on a
+        calc.calculate('a=2')
+        self.assertEqual([calc.variables[v] for v in 'abcd'],
+                         [2.0, 1.0, 3.0, 9.0])
+
+    def test_ans_is_replaced_by_its_value(self):
+        calc = Calculator(reactive=True)
+        calc.calculate('3*2')
+        calc.calculate('a=ans+1')
+        calc.calculate('100')  # a does not follow later answers
+        self.assertEqual(calc.variables['a'], 7.0)
+
+    def test_circular_reference(self):
+        calc = Calculator(reactive=True)
+        for line in ('a=1', 'b=a', 'c=b*2'):
+            calc.calculate(line)
+
+        for line in ('a=c', 'a=a+1', 'b=c'):
+            with self.subTest(line=line):
+                self.assertRaises(CircularReferenceError, calc.calculate,
+                                  line)
+        calc.calculate('a=3')  # the graph is unchanged
+        self.assertEqual(calc.variables['c'], 6.0)
+
+    def test_cycle_check_searches_downstream(self):
+        lookups = []
+
+        class Recording(dict):
+            def get(self, key, default=None):
+                lookups.append(key)
+                return super().get(key, default)
+
+        calc = Calculator(reactive=True)
+        names = ['v' + ''.join(chr(97 + int(d)) for d in str(i))
+                 for i in range(300)]
+        calc.calculate(f'{names[0]}=1')
+        for read, name in zip(names, names[1:]):
+            calc.calculate(f'{name}={read}+1')
+
+        # the chain upstream of a new variable is not visited
+        calc.dependencies = Recording(calc.dependencies)
+        calc.calculate(f'z={names[-1]}*2')
+        self.assertEqual(lookups, ['z'])
+        self.assertEqual(calc.variables['z'], 600.0)
+
+        self.assertRaises(CircularReferenceError, calc.calculate,
+                          f'{names[0]}=z')
+        calc.calculate(f'{names[0]}=0')
+        self.assertEqual(calc.variables['z'], 598.0)
+
+    def test_failed_recompute(self):
+        calc = Calculator(reactive=True)
+        for line in ('a=1', 'b=1/a', 'c=b+1', 'd=a+1'):
+            calc.calculate(line)
+
+        self.assertRaises(RecomputeError, calc.calculate, 'a=0')
+        self.assertEqual(calc.variables['d'], 1.0)
+        self.assertNotIn('b', calc.variables)
+        self.assertNotIn('c', calc.variables)
+
+        calc.calculate('a=2')  # the formulas are kept
+        self.assertEqual(calc.variables['c'], 1.5)
+
+    def test_failing_assignment_changes_nothing(self):
+        calc = Calculator(reactive=True)
+        calc.calculate('a=1')
+        self.assertRaises(ZeroDivisionError, calc.calculate, 'b=a/0')
+        self.assertRaises(UnknownVariableError, calc.calculate, 'b=z')
+        self.assertNotIn('b', calc.variables)
+        self.assertNotIn('b', calc.formulas)
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def test_records_every_stage(self):
+        calc = Calculator(backend='interpreter')
+        calc.variables['x'] = 2.0
+        profiler = calc.attach_profiler()
+        calc.calculate('x*(3+4)')
+        calc.calculate('x*(3+4)')  # compiled once
+
+        stages = profiler.summary()
+        self.assertEqual(set(stages), {'parse_input',
+                                       'convert_expression_to_rpn',
+                                       'fold_constants',
+                                       'calculate_expression'})
+        self.assertEqual(stages['parse_input']['calls'], 1)
+        self.assertEqual(stages['parse_input']['tokens'], 7)
+        self.assertEqual(stages['fold_constants']['tokens'], 5)
+        self.assertEqual(stages['calculate_expression']['calls'], 2)
+        self.assertEqual(stages['calculate_expression']['tokens'], 2*3)
+
+    def test_detach(self):
+        calc = Calculator()
+        profiler = StageProfiler()
+        self.assertIs(calc.attach_profiler(profiler), profiler)
+        calc.calculate('1+1')
+
+        self.assertIs(calc.detach_profiler(), profiler)
+        profiler.reset()
+        calc.calculate('2+2')
+        self.assertEqual(profiler.summary(), {})
+        self.assertNotIn('evaluate', vars(calc))
+
+
+class BudgetTest(unittest.TestCase):
+
+    def test_large_powers(self):
+        for backend in Calculator.backends:
+            calc = Calculator(backend=backend)
+            for source in ('9^9^9', '10^5000', '(0-10)^4301'):
+                calc.compile(source)
+                with self.subTest(backend=backend, source=source):
+                    start = time.perf_counter()
+                    self.assertRaises(BudgetExceededError, calc.calculate,
+                                      source)
+                    self.assertLess(time.perf_counter() - start, 1.0)
+
+            self.assertEqual(calc.calculate('0.1^5000'), 0.0)  # inexact
+            self.assertEqual(calc.calculate('10^300'), 1e300)
+
+    def test_operations(self):
+        source = '+'.join(['x']*20)
+        for backend in Calculator.backends:
+            calc = Calculator(backend=backend,
+                              budget=EvaluationBudget(10, 4300, 2.0))
+            calc.variables['x'] = 1.0
+            with self.subTest(backend=backend):
+                self.assertRaises(BudgetExceededError, calc.compile, source)
+                self.assertRaises(BudgetExceededError, calc.calculate,
+                                  source)
+                self.assertEqual(calc.calculate('x+x'), 2.0)
+
+                # compiled under a larger budget
+                calc.budget = DEFAULT_BUDGET
+                calc.compile(source)
+                calc.budget = EvaluationBudget(10, 4300, 2.0)
+                self.assertRaises(BudgetExceededError, calc.calculate,
+                                  source)
+
+    def test_time(self):
+        source = '*'.join(['x']*2000)
+        for backend in Calculator.backends:
+            calc = Calculator(backend=backend,
+                              budget=EvaluationBudget(10**6, 4300, 0.0))
+            calc.variables['x'] = 1.0
+            calc.compile(source)
+            with self.subTest(backend=backend):
+                self.assertRaises(BudgetExceededError, calc.calculate,
+                                  source)
+
+    def test_constant_folding(self):
+        calc = Calculator(budget=EvaluationBudget(10, 4300, 2.0))
+        self.assertRaises(BudgetExceededError, calc.compile,
+                          '+'.join(['1']*20))
+        self.assertEqual(calc.calculate('1+1'), 2.0)
+
+        calc = Calculator(budget=EvaluationBudget(10**6, 4300, 0.0))
+        self.assertRaises(BudgetExceededError, calc.compile,
+                          '*'.join(['1']*2000))
+
+    def test_fraction_results_are_size_checked(self):
+        calc = Calculator(numeric='fraction')
+        calc.calculate('a=10^4000')
+        for source in ('a*a', 'a+1/a', '1/a/a'):
+            with self.subTest(source=source):
+                self.assertRaises(BudgetExceededError, calc.calculate,
+                                  source)
+        self.assertEqual(calc.calculate('a/a'), 1)
+
+    def test_no_budget(self):
+        calc = Calculator(budget=None)  # the power is computed, and overflows
+        self.assertRaises(OverflowError, calc.calculate, '10^5000')
+        self.assertEqual(calc.calculate('+'.join(['1']*100)), 100.0)
+
+
+    def test_decimal_has_no_fast_path(self):
+        calc = Calculator(numeric='decimal')
+        calc.compile('2*3')
+        self.assertIsNone(calc.compile('2*3').fast)
+
+
+class FunctionTest(unittest.TestCase):
+
+    def test_builtin_outside_its_domain(self):
+        for numeric in Calculator.numeric_modes:
+            calc = Calculator(numeric=numeric)
+            for source in ('sqrt(0-1)', 'log(0-1)', 'sqrt((0-8)^(1/3))',
+                           'sin((0-1)^0.5)'):
+                # decimal (0-8)^(1/3) is already an invalid operation
+                with self.subTest(numeric=numeric, source=source), \
+                        self.assertRaises((InvalidExpressionError,
+                                           ArithmeticError)):
+                    calc.calculate(source)
+
+    def test_define_and_call(self):
+        for backend in Calculator.backends:
+            with self.subTest(backend=backend):
+                calc = Calculator(backend=backend)
+                calc.calculate('f(x,y)=x^2+y')
+                calc.calculate('x=10')
+                self.assertEqual(calc.calculate('f(2,3)*(-1)'), -7.0)
+                self.assertEqual(calc.calculate('f(x,f(1,1))'), 102.0)
+                self.assertEqual(calc.calculate('sqrt(abs(0-16))'), 4.0)
+                self.assertEqual(calc.calculate('f(2,3)'), 7.0)
+
+    def test_results_are_memoised(self):
+        calc = Calculator()
+        calc.calculate('f(x)=x*2')
+        for x in (1, 2, 1, 1):
+            calc.calculate(f'f({x})')
+        self.assertEqual(calc.function_stats()['f'],
+                         {'hits': 2, 'misses': 2, 'size': 2,
+                          'maxsize': 1024})
+
+    def test_memo_tells_equal_arguments_apart(self):
+        calc = Calculator()
+        calc.calculate('g(x)=x')
+        calc.calculate('g(0)')
+        self.assertEqual(str(calc.calculate('g(0*(0-1))')), '-0.0')
+
+        calc = Calculator(numeric='decimal')
+        calc.calculate('g(x)=x*1')
+        calc.calculate('g(2)')
+        self.assertEqual(str(calc.calculate('g(2.0)')), '2.0')
+
+    def test_calls_are_bound_when_defined(self):
+        calc = Calculator()
+        calc.calculate('f(x)=x+1')
+        calc.calculate('g(x)=f(x)*2')
+        calc.calculate('f(x)=0')
+        self.assertEqual(calc.calculate('g(3)'), 8.0)
+        self.assertEqual(calc.calculate('f(3)'), 0.0)
+
+    def test_unused_definitions_are_dropped(self):
+        calc = Calculator()
+        for i in range(100):
+            calc.calculate(f'f(x)=x+{i}')
+        calc.calculate('g(x)=f(x)*2')
+        calc.calculate('f(x)=0')
+        calc.calculate('h(x)=x')
+        self.assertEqual([d.source for d in calc.definitions.values()],
+                         ['f(x)=x+99', 'g(x)=f(x)*2', 'f(x)=0', 'h(x)=x'])
+
+        calc.calculate('g(x)=x')  # nothing calls the old f any more
+        self.assertEqual([d.source for d in calc.definitions.values()],
+                         ['f(x)=0', 'h(x)=x', 'g(x)=x'])
+
+    def test_invalid_definitions_and_calls(self):
+        calc = Calculator()
+        calc.calculate('f(x,y)=x*y')
+        for source, error in (('h(x)=h(x)', InvalidExpressionError),
+                              ('h(x)=y', InvalidExpressionError),
+                              ('h(x,x)=x', InvalidVariableError),
+                              ('sqrt(x)=x', InvalidVariableError),
+                              ('h(x)=q(x)', UnknownFunctionError),
+                              ('f(1)', InvalidExpressionError),
+                              ('q(1)', UnknownFunctionError),
+                              ('sqrt(0-1)', InvalidExpressionError),
+                              ('1,2', InvalidExpressionError)):
+            with self.subTest(source=source):
+                self.assertRaises(error, calc.calculate, source)
+        self.assertNotIn('h', calc.functions)
+
+    def test_same_results_on_both_backends(self):
+        definitions = {'f(a,b)': 'a*b-a', 'g(a)': 'f(a,a)+sqrt(abs(a))'}
+        expressions = ['f(x,2)+f(2,x)', 'f(1,2)*(0-sqrt(4))', 'g(x)^2',
+                       'g(f(x,x))', 'log(x)', 'f(x)', 'g()']
+        results = {}
+        for backend in Calculator.backends:
+            calc = Calculator(backend=backend)
+            calc.variables['x'] = 0.0
+            for signature, body in definitions.items():
+                calc.calculate(f'{signature}={body}')
+            for source in expressions:
+                calc.compile(source)
+            results[backend] = [outcome(calc.calculate, source)
+                                for source in expressions]
+        self.assertEqual(results['codegen'], results['interpreter'])
+
+    def test_parallel_batch(self):
+        lines = []
+        for i in range(200):
+            lines.append(f'f({i % 7})+x-g(x)')
+            if i % 40 == 0:
+                lines.extend([f'f(a)=a*{i}+1', f'x={i}', 'f(x)-ans'])
+            if i % 60 == 0:
+                lines.extend([f'g(a)=f(a)-{i}', f'g({i})'])
+
+        sequential, parallel = Calculator(), Calculator()
+        self.assertEqual(list(parallel.process_batch_parallel(
+                             lines, workers=2, chunk_lines=8)),
+                         list(sequential.process_batch(lines)))
+
+
+class NumericModeTest(unittest.TestCase):
+
+    def test_number_types(self):
+        calc = Calculator(numeric='fraction')
+        self.assertEqual(calc.calculate('1/3+1/3'), Fraction(2, 3))
+        self.assertEqual(calc.calculate('0.1*3'), Fraction(3, 10))
+        self.assertEqual(calc.calculate('4^(1/2)'), 2)
+
+        calc = Calculator(numeric='decimal', precision=5)
+        self.assertEqual(calc.calculate('1/3'), Decimal('0.33333'))
+        self.assertEqual(calc.calculate('0.1+0.2'), Decimal('0.3'))
+
+        self.assertRaises(ValueError, Calculator, numeric='complex')
+
+    def test_cache_is_kept_per_mode(self):
+        cache = ExpressionCache()
+        results = {numeric: Calculator(cache=cache,
+                                       numeric=numeric).calculate('1/4')
+                   for numeric in Calculator.numeric_modes}
+        self.assertEqual([type(value) for value in results.values()],
+                         [float, Fraction, Decimal])
+
+    def test_arrays_are_floats(self):
+        if np is None:
+            self.skipTest('requires NumPy')
+        calc = Calculator(numeric='fraction')
+        calc.calculate('f(a)=a/2')
+        self.assertEqual(calc.evaluate_array('f(x)+sqrt(4)', {'x': [1, 3]})
+                         .tolist(), [2.5, 3.5])
+
+
+class FastPathTest(unittest.TestCase):
+
+    """the float fast path of the fraction mode has to give the same results
+    as fraction arithmetic, in no mode may a result depend on whether the
+    expression was compiled before"""
+
+    def check_fast_path(self, expressions, variables):
+        for numeric in Calculator.numeric_modes:
+            calc = Calculator(numeric=numeric)
+            calc.variables.update({name: calc.number(str(value))
+                                   for name, value in variables.items()})
+            for source in expressions:
+                first = calc.compile(source)
+                compiled = calc.compile(source)  # with its generated code
+                exact = compiled._replace(fast=None)
+                with self.subTest(numeric=numeric, source=source):
+                    self.assertEqual(outcome(calc.evaluate, compiled),
+                                     outcome(calc.evaluate, exact))
+                    self.assertEqual(outcome(calc.evaluate, compiled),
+                                     outcome(calc.evaluate, first))
+
+    def test_integer_expressions(self):
+        expressions = random_expressions(400, ops='+-*^', integers=True)
+        for x, y in ((0, 0), (0, -1), (3, -7), (2**20, 5), (2**40, -3)):
+            self.check_fast_path(expressions, {'x': x, 'y': y})
+
+    def test_zeros(self):
+        self.check_fast_path(['0^0', 'x^0', 'x*(0-1)', '0-x', '(0-x)*y'],
+                             {'x': 0, 'y': 0})
+
+    def test_only_integer_expressions(self):
+        calc = Calculator(numeric='fraction')
+        for source, fast in (('x*2+1', True), ('x^3-y', True),
+                             ('x/2', False), ('x^y', False),
+                             ('0.5*x', False), ('sqrt(x)', False)):
+            calc.compile(source)
+            with self.subTest(source=source):
+                self.assertEqual(calc.compile(source).fast is not None,
+                                 fast)
+
+
+class WorkspaceTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'workspace.calc')
+
+    def round_trip(self, calc, **options):
+        calc.save_workspace(self.path)
+        loaded = Calculator(numeric=calc.numeric, reactive=calc.reactive,
+                            **options)
+        loaded.load_workspace(self.path)
+        return loaded
+
+    def assertSameValues(self, a, b):
+        # by text and type, which keeps e.g. -0 and 0 or 1/3 and 0.333 apart
+        self.assertEqual({k: (type(v), str(v)) for k, v in a.items()},
+                         {k: (type(v), str(v)) for k, v in b.items()})
+
+    def test_values_of_every_type(self):
+        values = {'float': {'a': 0.1, 'b': -0.0, 'c': float('inf'),
+                            'd': 1e-300, 'z': complex(1.5, -2)},
+                  'fraction': {'a': Fraction(1, 3), 'b': Fraction(-7),
+                               'c': Fraction(10**50, 3), 'z': 1j},
+                  'decimal': {'a': Decimal('0.1000'), 'b': Decimal('-0'),
+                              'c': Decimal('1E+99'), 'd': Decimal('NaN'),
+                              'z': complex(0, 1)}}
+        for numeric, variables in values.items():
+            with self.subTest(numeric=numeric):
+                calc = Calculator(numeric=numeric)
+                calc.variables.update(variables)
+                self.assertSameValues(self.round_trip(calc).variables,
+                                      calc.variables)
+
+    def test_formulas_and_functions(self):
+        lines = ['a=2', 'f(x,y)=x^2+y', 'g(x)=f(x,1)*2', 'f(x,y)=x-y',
+                 'b=a*3+1/3', 'c=g(a)+f(b,a)', 'd=c/b']
+        for numeric in Calculator.numeric_modes:
+            for backend in Calculator.backends:
+                with self.subTest(numeric=numeric, backend=backend):
+                    calc = Calculator(numeric=numeric, reactive=True,
+                                      backend=backend)
+                    for line in lines:
+                        calc.calculate(line)
+                    loaded = self.round_trip(calc, backend=backend)
+                    self.assertSameValues(loaded.variables, calc.variables)
+
+                    # formulas still update, g still calls the first f
+                    for c in (calc, loaded):
+                        c.calculate('a=5')
+                    self.assertSameValues(loaded.variables, calc.variables)
+                    self.assertEqual(loaded.calculate('g(3)'),
+                                     calc.calculate('g(3)'))
+                    self.assertEqual(
+                        [d.source for d in loaded.definitions.values()],
+                        [d.source for d in calc.definitions.values()])
+
+    def test_load_replaces_the_workspace(self):
+        calc = Calculator()
+        calc.calculate('a=1')
+        calc.save_workspace(self.path)
+
+        other = Calculator()
+        other.calculate('b=2')
+        other.calculate('h(x)=x')
+        other.execute_command(r'\load ' + self.path)
+        self.assertEqual(other.variables, {'a': 1.0, 'ans': 1.0})
+        self.assertNotIn('h', other.functions)
+
+    def test_bad_files(self):
+        calc = Calculator()
+        calc.calculate('a=1/3')
+        calc.save_workspace(self.path)
+        with open(self.path, 'rb') as file:
+            data = file.read()
+
+        damaged = bytearray(data)
+        damaged[-1] ^= 1
+        for content in (b'', b'not a workspace', data[:-1], bytes(damaged)):
+            with open(self.path, 'wb') as file:
+                file.write(content)
+            with self.subTest(content=content[:20]):
+                self.assertRaises(WorkspaceError, calc.load_workspace,
+                                  self.path)
+                self.assertEqual(calc.variables['a'], 1/3)  # unchanged
+
+        with open(self.path, 'wb') as file:
+            file.write(data)
+        self.assertRaises(WorkspaceError,
+                          Calculator(numeric='fraction').load_workspace,
+                          self.path)
+        self.assertRaises(WorkspaceError, calc.load_workspace,
+                          self.path + '.missing')
+
+    def test_load_in_a_parallel_batch(self):
+        calc = Calculator()
+        calc.calculate('f(x)=x*10')
+        calc.save_workspace(self.path)
+
+        lines = (['f(x)=x+1'] + [f'f({i})' for i in range(40)]
+                 + [r'\load ' + self.path] + [f'f({i})' for i in range(40)])
+        self.assertEqual(
+            list(Calculator().process_batch_parallel(lines, workers=2,
+                                                     chunk_lines=8)),
+            list(Calculator().process_batch(lines)))
+
+
+if __name__ == '__main__':
+    unittest.main()
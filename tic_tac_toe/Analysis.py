@@ -0,0 +1,145 @@
+import argparse
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from Board import Board, BoardSnapshot
+import Registry
+
+
+PositionScore = namedtuple('PositionScore',
+                           ('turn', 'marker', 'move', 'score', 'best_move',
+                            'best_score', 'loss', 'blunder'))
+
+
+def replay(moves: Sequence[tuple], board_size: int = 3,
+           players: Sequence[str] = ('X', 'O')
+           ) -> Iterator[Tuple[BoardSnapshot, str, tuple]]:
+    """
+    Rebuilds a recorded game one move at a time. Yields the position before
+    each move together with the marker of the player to move and the move
+    they played.
+    """
+
+    board = Board(n=board_size)
+    for turn, coords in enumerate(moves):
+        marker = players[turn % len(players)]
+        yield board.snapshot(), marker, coords
+
+        board.set_elem(*coords, marker)
+        if board.completes_line(*coords) and (turn != len(moves) - 1):
+            raise ValueError(f'Game continues after {marker} won '
+                             f'(turn {turn})')
+
+
+def _score_position(args: tuple) -> tuple:
+    snapshot, marker, players, coords, bot = args
+
+    board = Board(n=snapshot.board_size)
+    board.restore(snapshot)
+
+    scores = bot(marker).score_moves(board, list(players))
+    best = max(scores, key=scores.get)
+    return scores[coords], best, scores[best]
+
+
+def _collect(positions: list, futures: list,
+             margin: float) -> List[PositionScore]:
+    results = []
+    for turn, ((_, marker, coords), future) in enumerate(zip(positions,
+                                                             futures)):
+        score, best, best_score = future.result()
+        loss = best_score - score
+        results.append(PositionScore(turn, marker, coords, score, best,
+                                     best_score, loss, loss > margin))
+    return results
+
+
+def analyse_games(games: Iterable[Sequence[tuple]], board_size: int = 3,
+                  players: Sequence[str] = ('X', 'O'),
+                  bot: Optional[type] = None,
+                  workers: Optional[int] = None,
+                  margin: Optional[float] = None,
+                  max_pending: Optional[int] = None
+                  ) -> Iterator[List[PositionScore]]:
+    """
+    Scores every position of each recorded game with a search bot (any agent
+    providing "score_moves"), evaluating the positions in a process pool.
+    Defaults to BotMaxLikelihood. A move is marked as a blunder when it
+    scores more than "margin" below the best move available to the player.
+    Games are read lazily and at most "max_pending" of them are in flight at
+    once, so memory use does not grow with the number of games. Results are
+    yielded in the order of "games".
+    """
+
+    if bot is None:
+        bot = Registry.get('max_likelihood').load()
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2*workers
+    if margin is None:
+        margin = bot.BLUNDER_MARGIN
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for moves in games:
+            positions = list(replay(moves, board_size, players))
+            futures = [pool.submit(_score_position,
+                                   (snapshot, marker, tuple(players), coords,
+                                    bot))
+                       for snapshot, marker, coords in positions]
+            pending.append((positions, futures))
+
+            if len(pending) >= max_pending:
+                yield _collect(*pending.popleft(), margin)
+
+        while pending:
+            yield _collect(*pending.popleft(), margin)
+
+
+def analyse_game(moves: Sequence[tuple], **kwargs) -> List[PositionScore]:
+    """analyses a single game, see "analyse_games" for the options"""
+    return next(analyse_games([moves], **kwargs))
+
+
+def parse_moves(line: str) -> List[tuple]:
+    """parses a game written as space separated "x,y" board coordinates"""
+    return [tuple(map(int, move.split(','))) for move in line.split()]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Score every position of '
+                                     'recorded games and mark blunders. '
+                                     'Each line of the input file is one '
+                                     'game written as "x,y x,y ...".')
+    parser.add_argument('games', help='file of recorded games')
+    parser.add_argument('-n', '--board-size', type=int, default=3)
+    parser.add_argument('-p', '--players', default='XO',
+                        help='markers in turn order')
+    parser.add_argument('-b', '--bot', default='Hard',
+                        help='key of the bot used to score positions')
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    entry = Registry.find(args.bot)
+    if entry is None:
+        parser.error(f'unknown bot "{args.bot}"')
+    bot = entry.load()
+    if not hasattr(bot, 'score_moves'):  # only search bots score moves
+        parser.error(f'the {entry.name} bot can not score positions')
+
+    with open(args.games) as file:
+        games = (parse_moves(line) for line in file if line.strip())
+        results = analyse_games(games, board_size=args.board_size,
+                                players=args.players,
+                                bot=bot,
+                                workers=args.workers)
+
+        for game_number, positions in enumerate(results, start=1):
+            print(f'Game {game_number}')
+            for p in positions:
+                flag = '  <- blunder' if p.blunder else ''
+                print(f'\t{p.turn:>3} {p.marker} {p.move} '
+                      f'score {p.score:.4g} (best {p.best_move} '
+                      f'{p.best_score:.4g}){flag}')
@@ -63,6 +63,55 @@ class BoardIterator():
             return self._board.get_elem(self._x, self._y)
 
 
+class BoardSnapshot():
+
+    """
+    Immutable copy of a board's state. The cells are packed row by row into a
+    bytes object (one byte per cell, 0 for an empty cell, otherwise the
+    marker's character code), so snapshots are small, hashable and cheap to
+    pickle. The hash is computed once on creation.
+    """
+
+    __slots__ = ('board_size', 'cells', '_hash')
+
+    def __init__(self, board_size: int, cells: bytes) -> None:
+        if len(cells) != board_size*board_size:
+            raise ValueError('cells do not match the board size')
+
+        object.__setattr__(self, 'board_size', board_size)
+        object.__setattr__(self, 'cells', bytes(cells))
+        object.__setattr__(self, '_hash', hash((board_size, self.cells)))
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError('BoardSnapshot is immutable')
+
+    def __delattr__(self, name) -> None:
+        raise AttributeError('BoardSnapshot is immutable')
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BoardSnapshot):
+            return NotImplemented
+        return (self._hash == other._hash) and (self.cells == other.cells)
+
+    def __reduce__(self) -> tuple:
+        return (BoardSnapshot, (self.board_size, self.cells))
+
+    def __repr__(self) -> str:
+        return f'BoardSnapshot({self.board_size}, {self.cells!r})'
+
+    def get_elem(self, x: int, y: int) -> Union[str, None]:
+        code = self.cells[y*self.board_size + x]
+        return chr(code) if code else None
+
+    def vacancies(self) -> list:
+        n = self.board_size
+        return [(i % n, i // n) for i, code in enumerate(self.cells)
+                if code == 0]
+
+
 class Board(Abstract_Board):
 
     def __init__(self, **kwargs) -> None:
@@ -108,6 +157,48 @@ class Board(Abstract_Board):
         n = self.board_size
         return tuple(self.get_elem(i, n - 1 - i) for i in range(n))
 
+    def snapshot(self) -> BoardSnapshot:
+        """
+        returns an immutable, hashable copy of the current state. Markers must
+        be single characters with a code point below 256.
+        """
+
+        try:
+            cells = bytes(0 if m is None else ord(m)
+                          for row in self.field for m in row)
+        except (TypeError, ValueError):
+            raise ValueError('Snapshots only support single byte markers')
+        return BoardSnapshot(self.board_size, cells)
+
+    def restore(self, snapshot: BoardSnapshot) -> None:
+        """replaces the board's state (and size) with that of a snapshot"""
+
+        n = snapshot.board_size
+        decoded = [chr(code) if code else None for code in snapshot.cells]
+
+        self.board_size = n
+        self.field = [decoded[y*n:(y + 1)*n] for y in range(n)]
+
+    def completes_line(self, x: int, y: int) -> bool:
+        """
+        checks whether the marker at (x, y) fills its row, column or one of
+        the diagonals it lies on. Only the lines through the last move need to
+        be checked to detect a win.
+        """
+
+        marker = self.get_elem(x, y)
+        if marker is None:
+            return False
+
+        n = self.board_size
+        lines = [self.row(y), self.column(x)]
+        if x == y:
+            lines.append(self.diagonal())
+        if x == (n - 1 - y):
+            lines.append(self.reverse_diagonal())
+
+        return any(line.count(marker) == n for line in lines)
+
 
 if __name__ == '__main__':
     pass
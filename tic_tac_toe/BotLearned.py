@@ -0,0 +1,56 @@
+import os
+import random
+from typing import Optional
+from Board import Board
+from Players import TicTacToe_Player
+from ValueTable import (DEFAULT_VALUE, ValueTable, cell_weights, encode,
+                        table_path)
+
+
+class BotLearned(TicTacToe_Player):
+
+    BLUNDER_MARGIN = 0.1  # value lost by a move before it counts as a blunder
+
+    _tables = {}  # board_size: ValueTable (None if no table was trained)
+
+    @property
+    def strategy(self):
+        return 'Learned'
+
+    @classmethod
+    def load_table(cls, board_size: int) -> Optional[ValueTable]:
+        if board_size not in cls._tables:
+            path = table_path(board_size)
+            if os.path.exists(path):
+                cls._tables[board_size] = ValueTable.load(path)
+            else:
+                cls._tables[board_size] = None
+        return cls._tables[board_size]
+
+    def score_moves(self, board: Board, players: list) -> dict:
+        """learned value of the position reached by every possible move"""
+
+        vacancies = board.vacancies()
+        table = self.load_table(board.board_size)
+        if (table is None) or (len(players) != 2):
+            return dict.fromkeys(vacancies, DEFAULT_VALUE)
+
+        # the key of each afterstate differs from the current state's key by
+        # the place value of the cell the move is made in
+        n = board.board_size
+        weights = cell_weights(n)
+        base = encode(board, self.marker)
+        return {(x, y): table.get(base + weights[y*n + x])
+                for x, y in vacancies}
+
+    def move(self, board: Board, players: list) -> tuple:
+
+        scores = self.score_moves(board, players)
+
+        best = max(scores.values())
+        return random.choice([coords for coords, value in scores.items()
+                              if value == best])
+
+
+if __name__ == '__main__':
+    pass
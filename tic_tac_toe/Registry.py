@@ -0,0 +1,120 @@
+from importlib import import_module
+from typing import Dict, Optional, Tuple
+
+
+class AgentEntry():
+
+    """
+    Declares an agent by name and entry point ("module:ClassName") along with
+    the keys and description shown in the menu, the agent classes do not
+    declare them. The module defining the agent is only imported the first
+    time "load" is called, so heavy agents (large tables, numerical
+    libraries) cost nothing until they are selected.
+    "max_board_size" is the largest board the agent moves on in reasonable
+    time (None if it has no limit), see Tournament.run_tournament.
+    """
+
+    def __init__(self, name: str, entry_point: str, keys: Tuple[str],
+                 description: Tuple[str], human: bool = False,
+                 max_board_size: Optional[int] = None) -> None:
+        self.name = name
+        self.entry_point = entry_point
+        self.keys = tuple(keys)
+        self.description = tuple(description)
+        self.human = human
+        self.max_board_size = max_board_size
+        self._agent = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._agent is not None
+
+    def load(self) -> type:
+        if self._agent is None:
+            module_name, _, attr = self.entry_point.partition(':')
+            self._agent = getattr(import_module(module_name), attr)
+        return self._agent
+
+
+_entries: Dict[str, AgentEntry] = {}
+
+
+def register(name: str, entry_point: str, keys: Tuple[str],
+             description: Tuple[str], human: bool = False,
+             max_board_size: Optional[int] = None) -> AgentEntry:
+    if name in _entries:
+        raise ValueError(f'An agent named "{name}" is already registered')
+    _entries[name] = AgentEntry(name, entry_point, keys, description, human,
+                                max_board_size)
+    return _entries[name]
+
+
+def get(name: str) -> AgentEntry:
+    return _entries[name]
+
+
+def entries() -> Tuple[AgentEntry]:
+    return tuple(_entries.values())
+
+
+def bots(board_size: Optional[int] = None) -> Tuple[AgentEntry]:
+    """all computer players, or those able to play on "board_size" """
+    return tuple(entry for entry in _entries.values()
+                 if (not entry.human) and (
+                     (board_size is None) or (entry.max_board_size is None)
+                     or (board_size <= entry.max_board_size)))
+
+
+def find(key: str) -> Optional[AgentEntry]:
+    """looks up an agent by any of its menu keys (case insensitive)"""
+    for entry in _entries.values():
+        if key.lower() in (k.lower() for k in entry.keys):
+            return entry
+    return None
+
+
+register('random', 'Players:BotRandom',
+         keys=("0", "Easy", "Random"),
+         description=('Chooses a free space at random.',))
+
+register('defensive', 'Players:BotDefensive',
+         keys=("1", "Medium", "Defensive"),
+         description=(
+                      'Will try to block another player from winning,',
+                      'otherwise chooses randomly.'
+                      ))
+
+register('max_likelihood', 'BotMaxLikelihood:BotMaxLikelihood',
+         keys=("2", "Hard", "Maximum Likelihood", "Heuristic"),
+         description=(
+                      'selects its next move by choosing the move which',
+                      'yields the maximum likelihood of winning based on a',
+                      'heuristic scoring function. This Bot plays against',
+                      'itself recursively to determine the likelihood of',
+                      'winning for all possible future moves and is,',
+                      'therefore, more memory and is more computationally',
+                      'expensize. May have long run-times on large boards.',
+                      ),
+         max_board_size=3)  # exhaustive search, hopeless beyond 3x3
+
+register('learned', 'BotLearned:BotLearned',
+         keys=("4", "Learned", "Value Table", "Lookup"),
+         description=(
+                      'Plays from a table of position values learned offline',
+                      'by playing against itself (see SelfPlay.py). Each move',
+                      'costs a single table lookup per free space. Falls back',
+                      'to random moves when no table has been trained for the',
+                      'board size or when there are more than two players.',
+                      ))
+
+register('human', 'Players:User',
+         keys=("3", 'Human', 'General Intelligence', 'Agent', 'AI'),
+         description=(
+                      'Relies on the intelligence of a Human or other',
+                      'intelligent agent to determine the best move'
+                      ),
+         human=True)
+
+
+if __name__ == '__main__':
+    pass
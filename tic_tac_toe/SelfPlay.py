@@ -0,0 +1,168 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+from Board import Board
+from ValueTable import (DEFAULT_VALUE, MAX_BOARD_SIZE, ValueTable,
+                        cell_weights, encode, table_path)
+
+
+MARKERS = ('X', 'O')
+
+
+def choose_move(board: Board, marker: str, values: Dict[int, float],
+                epsilon: float, rng: random.Random) -> Tuple[tuple, int]:
+    """
+    epsilon-greedy move selection over the afterstates reachable from
+    "board". Returns the chosen coordinates and the key of the afterstate.
+    """
+
+    n = board.board_size
+    weights = cell_weights(n)
+    base = encode(board, marker)
+    vacancies = board.vacancies()
+
+    if rng.random() < epsilon:
+        x, y = rng.choice(vacancies)
+        return (x, y), base + weights[y*n + x]
+
+    best_value, best = None, []
+    for x, y in vacancies:
+        key = base + weights[y*n + x]  # marker placed at (x, y)
+        value = values.get(key, DEFAULT_VALUE)
+        if (best_value is None) or (value > best_value):
+            best_value, best = value, [((x, y), key)]
+        elif value == best_value:
+            best.append(((x, y), key))
+    return rng.choice(best)
+
+
+def _update(values: Dict[int, float], visits: Dict[int, int], key: int,
+            target: float, alpha: float) -> None:
+    value = values.get(key, DEFAULT_VALUE)
+    values[key] = value + alpha*(target - value)
+    visits[key] = visits.get(key, 0) + 1
+
+
+def play_episode(board: Board, values: Dict[int, float],
+                 visits: Dict[int, int], alpha: float, epsilon: float,
+                 rng: random.Random) -> None:
+    """
+    Plays one game of the bot against itself, applying TD(0) updates to the
+    value of each player's afterstates as the game goes on.
+    """
+
+    board.reset()
+    last_key = dict.fromkeys(MARKERS)
+    n_cells = board.board_size**2
+
+    for turn in range(n_cells):
+        marker = MARKERS[turn % 2]
+        opponent = MARKERS[(turn + 1) % 2]
+
+        (x, y), key = choose_move(board, marker, values, epsilon, rng)
+        board.set_elem(x, y, marker)
+
+        # the game is over, both players' last afterstates learn the final
+        # value (the mover's previous one backs up from this move's value)
+        if board.completes_line(x, y):
+            _update(values, visits, key, 1.0, 1.0)
+            if last_key[marker] is not None:
+                _update(values, visits, last_key[marker], 1.0, alpha)
+            if last_key[opponent] is not None:
+                _update(values, visits, last_key[opponent], 0.0, alpha)
+            return
+
+        if turn == (n_cells - 1):  # board is full, draw
+            _update(values, visits, key, 0.5, 1.0)
+            if last_key[marker] is not None:
+                _update(values, visits, last_key[marker], 0.5, alpha)
+            _update(values, visits, last_key[opponent], 0.5, alpha)
+            return
+
+        if last_key[marker] is not None:
+            target = values.get(key, DEFAULT_VALUE)
+            _update(values, visits, last_key[marker], target, alpha)
+        last_key[marker] = key
+
+
+def _self_play_worker(args: tuple) -> Tuple[Dict[int, float],
+                                            Dict[int, int]]:
+    board_size, episodes, values, alpha, epsilon, seed = args
+
+    rng = random.Random(seed)
+    board = Board(n=board_size)
+    local_values = dict(values)
+    visits = {}
+
+    for _ in range(episodes):
+        play_episode(board, local_values, visits, alpha, epsilon, rng)
+
+    # only the states this worker learned something about are sent back
+    return {key: local_values[key] for key in visits}, visits
+
+
+def merge(values: Dict[int, float],
+          results: List[Tuple[Dict[int, float], Dict[int, int]]]
+          ) -> Dict[int, float]:
+    """
+    Combines the tables learned by independent workers, weighting each
+    worker's estimate of a state by the number of times it visited it.
+    """
+
+    weighted, counts = {}, {}
+    for worker_values, worker_visits in results:
+        for key, n in worker_visits.items():
+            weighted[key] = weighted.get(key, 0.0) + n*worker_values[key]
+            counts[key] = counts.get(key, 0) + n
+
+    merged = dict(values)
+    for key, total in weighted.items():
+        merged[key] = total/counts[key]
+    return merged
+
+
+def train(board_size: int = 3, episodes: int = 200_000, rounds: int = 10,
+          workers: Optional[int] = None, alpha: float = 0.2,
+          epsilon: float = 0.1, seed: int = 0) -> ValueTable:
+    """
+    Trains a value table by self-play. Each round splits its share of the
+    episodes across "workers" processes which all start from the table merged
+    at the end of the previous round.
+    """
+
+    if not (2 <= board_size <= MAX_BOARD_SIZE):
+        raise ValueError(f'board_size must be in 2-{MAX_BOARD_SIZE}')
+
+    workers = workers or os.cpu_count() or 1
+    per_worker = max(1, episodes // (rounds*workers))
+
+    values = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for r in range(rounds):
+            jobs = [(board_size, per_worker, values, alpha, epsilon,
+                     seed + r*workers + w) for w in range(workers)]
+            values = merge(values, list(pool.map(_self_play_worker, jobs)))
+
+    return ValueTable.from_dict(board_size, values)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Train the value table '
+                                     'used by BotLearned through self-play')
+    parser.add_argument('-n', '--board-size', type=int, default=3)
+    parser.add_argument('-e', '--episodes', type=int, default=200_000)
+    parser.add_argument('-r', '--rounds', type=int, default=10)
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None)
+    args = parser.parse_args()
+
+    table = train(board_size=args.board_size, episodes=args.episodes,
+                  rounds=args.rounds, workers=args.workers, seed=args.seed)
+
+    path = args.output or table_path(args.board_size)
+    table.save(path)
+    print(f'{len(table)} states written to {path}')
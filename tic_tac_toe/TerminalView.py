@@ -1,6 +1,6 @@
 from typing import Dict, Tuple
 from Board import Board
-from Players import TicTacToe_Player
+from Registry import AgentEntry
 import os
 
 
@@ -66,7 +66,7 @@ def select_bot_players() -> None:
     print('\nEnter number of computer players (0:10)\n')
 
 
-def select_strategy(valid_agents: Dict[Tuple, TicTacToe_Player]) -> None:
+def select_strategy(valid_agents: Dict[Tuple, AgentEntry]) -> None:
 
     pad = "\n\t\t"
     print('\nChoose computer strategy:\n')
@@ -1,5 +1,6 @@
 import Players
 from Board import Board
+import Registry
 import TerminalView as View
 from itertools import cycle
 from typing import Dict
@@ -7,7 +8,8 @@ from typing import Dict
 
 class TicTacToe():
 
-    supported_bots = {agent.keys(): agent for agent in Players.valid_agents}
+    # agents are only imported once selected, see Registry.AgentEntry.load
+    supported_bots = {entry.keys: entry for entry in Registry.entries()}
 
     def __init__(self, **kwargs) -> None:
         self.players = {}
@@ -35,11 +37,6 @@ class TicTacToe():
     def in_progress(self) -> bool:
         return (not self.win) and (len(self.board.vacancies()) > 0)
 
-    def is_bot(self, player: Players.TicTacToe_Player) -> bool:
-        val = issubclass(player, Players.TicTacToe_Player)
-        val &= (not issubclass(player, Players.User))
-        return val
-
     def is_bot_instance(self, player: Players.TicTacToe_Player) -> bool:
         val = isinstance(player, Players.TicTacToe_Player)
         val &= (not isinstance(player, Players.User))
@@ -132,14 +129,15 @@ class TicTacToe():
         if options['n_bots'] > 0:
 
             supported_agents = self.supported_bots.items()
-            bots = {k: a for k, a in supported_agents if self.is_bot(a)}
+            bots = {k: e for k, e in supported_agents if not e.human}
             View.select_strategy(bots)
             while options.get('strategy') is None:
                 user_input = self.process_input(input())
 
-                for keys, agent in bots.items():
+                for keys, entry in bots.items():
                     if user_input in (k.lower() for k in keys):
-                        options['strategy'] = agent.keys()
+                        entry.load()  # first use imports the agent's module
+                        options['strategy'] = entry.keys
                         break
                 else:
                     View.invalid_input()
@@ -219,8 +217,8 @@ class TicTacToe():
                         self.players[marker] = Players.User(marker)
                         game_options['n_humans'] -= 1
                     elif game_options['n_bots']:
-                        agent = self.supported_bots[game_options['strategy']]
-                        self.players[marker] = agent(marker)
+                        entry = self.supported_bots[game_options['strategy']]
+                        self.players[marker] = entry.load()(marker)
                         game_options['n_bots'] -= 1
 
             # start
@@ -0,0 +1,132 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations, product
+import os
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from Board import Board
+import Registry
+
+
+ELO_INITIAL = 1500
+ELO_K = 32
+
+MARKERS = ('X', 'O')
+
+
+def play_game(args: tuple) -> Tuple[Optional[int], List[List[float]]]:
+    """
+    Plays a headless game between two agents. Returns the seat of the winner
+    (None for a draw) and the total time spent in "move" and the number of
+    moves made for each seat.
+    """
+
+    first, second, board_size, seed = args
+    random.seed(seed)
+
+    board = Board(n=board_size)
+    agents = (first(MARKERS[0]), second(MARKERS[1]))
+    timings = [[0.0, 0], [0.0, 0]]
+
+    for turn in range(board_size**2):
+        seat = turn % 2
+
+        start = time.perf_counter()
+        coords = agents[seat].move(board, list(MARKERS))
+        timings[seat][0] += time.perf_counter() - start
+        timings[seat][1] += 1
+
+        board.set_elem(*coords, MARKERS[seat])
+        if board.completes_line(*coords):
+            return seat, timings
+
+    return None, timings
+
+
+def expected_score(rating: float, opponent_rating: float) -> float:
+    return 1/(1 + 10**((opponent_rating - rating)/400))
+
+
+def schedule(agents: Sequence[type], board_sizes: Iterable[int],
+             seeds: int) -> List[tuple]:
+    """every ordered pair of distinct agents, on every board size and seed"""
+    return [(first, second, n, seed)
+            for n, (first, second), seed in product(board_sizes,
+                                                    permutations(agents, 2),
+                                                    range(seeds))]
+
+
+def run_tournament(agents: Optional[Sequence[type]] = None,
+                   board_sizes: Iterable[int] = (3,), seeds: int = 10,
+                   workers: Optional[int] = None) -> Dict[str, dict]:
+    """
+    Round-robin tournament between all bots, both seat orders of each pairing
+    are played once per seed and board size. Games run in a process pool,
+    ratings are updated in schedule order so results are reproducible. By
+    default each board size only includes the bots able to play on it (see
+    Registry.AgentEntry.max_board_size), given "agents" play on every size.
+    """
+
+    if agents is None:
+        games = []
+        for n in board_sizes:
+            bots = [entry.load() for entry in Registry.bots(n)]
+            games.extend(schedule(bots, (n,), seeds))
+        agents = list(dict.fromkeys(first for first, *_ in games))
+    else:
+        games = schedule(agents, board_sizes, seeds)
+
+    stats = {a.__name__: {'rating': ELO_INITIAL, 'wins': 0, 'draws': 0,
+                          'losses': 0, 'move_time': 0.0, 'moves': 0}
+             for a in agents}
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(play_game, games,
+                           chunksize=max(1, len(games) // (4*workers)))
+
+        for (first, second, _, _), (winner, timings) in zip(games, results):
+            a, b = stats[first.__name__], stats[second.__name__]
+
+            for seat, player in enumerate((a, b)):
+                player['move_time'] += timings[seat][0]
+                player['moves'] += timings[seat][1]
+
+            if winner is None:
+                score = 0.5
+                a['draws'] += 1
+                b['draws'] += 1
+            else:
+                score = 1.0 if winner == 0 else 0.0
+                (a, b)[winner]['wins'] += 1
+                (b, a)[winner]['losses'] += 1
+
+            delta = ELO_K*(score - expected_score(a['rating'], b['rating']))
+            a['rating'] += delta
+            b['rating'] -= delta
+
+    return stats
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Round-robin tournament '
+                                     'between the computer players')
+    parser.add_argument('-n', '--board-sizes', type=int, nargs='+',
+                        default=[3], help='the search bot (Hard) only plays '
+                        'on boards up to 3x3, its moves take too long on '
+                        'larger ones')
+    parser.add_argument('-s', '--seeds', type=int, default=10)
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    stats = run_tournament(board_sizes=args.board_sizes, seeds=args.seeds,
+                           workers=args.workers)
+
+    print(f'{"Agent":<20}{"Elo":>8}{"W":>6}{"D":>6}{"L":>6}'
+          f'{"ms/move":>12}')
+    for name, s in sorted(stats.items(), key=lambda i: -i[1]['rating']):
+        latency = 1000*s['move_time']/max(s['moves'], 1)
+        print(f'{name:<20}{s["rating"]:>8.0f}{s["wins"]:>6}{s["draws"]:>6}'
+              f'{s["losses"]:>6}{latency:>12.3f}')
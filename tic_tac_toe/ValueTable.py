@@ -0,0 +1,172 @@
+from array import array
+from functools import lru_cache
+import os
+import struct
+import sys
+from typing import Dict, Tuple
+from Board import Board
+
+
+EMPTY_KEY = -1
+DEFAULT_VALUE = 0.5  # value of a never visited state (even odds)
+MAX_BOARD_SIZE = 5  # 3**(n*n) must fit into a signed 64 bit key
+
+_GOLDEN = 0x9E3779B97F4A7C15  # fibonacci hashing multiplier
+_MASK_64 = (1 << 64) - 1
+
+
+@lru_cache(maxsize=None)
+def cell_weights(board_size: int) -> Tuple[int]:
+    """base-3 place value of each cell, indexed by y*board_size + x"""
+    return tuple(3**i for i in range(board_size*board_size))
+
+
+def encode(board: Board, marker: str) -> int:
+    """
+    Encodes a 2 player board as a base-3 integer seen from the perspective of
+    "marker": empty cells are 0, cells owned by "marker" are 1 and cells owned
+    by the opponent are 2. Encoding relative to the player makes the learned
+    values independent of the markers chosen in the menu.
+    """
+
+    weights = cell_weights(board.board_size)
+    n = board.board_size
+
+    key = 0
+    for y, row in enumerate(board.field):
+        for x, elem in enumerate(row):
+            if elem is not None:
+                key += weights[y*n + x] * (1 if elem == marker else 2)
+    return key
+
+
+def table_path(board_size: int) -> str:
+    """default location of the value table trained for a board size"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    file_name = f'value_table_{board_size}x{board_size}.bin'
+    return os.path.join(directory, file_name)
+
+
+class ValueTable():
+
+    """
+    Open addressing hash table mapping encoded board states (see "encode") to
+    the learned probability that the player who just moved goes on to win.
+    Keys and values live in two flat arrays (8 + 4 bytes per slot) so a table
+    can be written to and read from disk in one block, and a lookup is a
+    single hash plus a short linear probe.
+    """
+
+    _HEADER = struct.Struct('<4sHHI')  # magic, version, board size, capacity
+    _MAGIC = b'TTTV'
+    _VERSION = 1
+
+    def __init__(self, board_size: int, capacity: int = 16) -> None:
+        self.board_size = board_size
+
+        bits = max(4, (capacity - 1).bit_length())
+        self._shift = 64 - bits
+        self._mask = (1 << bits) - 1
+        self._keys = array('q', [EMPTY_KEY]) * (1 << bits)
+        self._values = array('f', [DEFAULT_VALUE]) * (1 << bits)
+        self._count = 0
+
+    @classmethod
+    def from_dict(cls, board_size: int,
+                  values: Dict[int, float]) -> 'ValueTable':
+        # keep the load factor at or below 0.5 so probe sequences stay short
+        table = cls(board_size, capacity=2*max(len(values), 1))
+        for key, value in values.items():
+            table[key] = value
+        return table
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _slot(self, key: int) -> int:
+        i = ((key * _GOLDEN) & _MASK_64) >> self._shift
+        keys = self._keys
+        while keys[i] != key and keys[i] != EMPTY_KEY:
+            i = (i + 1) & self._mask
+        return i
+
+    def __contains__(self, key: int) -> bool:
+        return self._keys[self._slot(key)] == key
+
+    def __getitem__(self, key: int) -> float:
+        i = self._slot(key)
+        if self._keys[i] != key:
+            raise KeyError(key)
+        return self._values[i]
+
+    def __setitem__(self, key: int, value: float) -> None:
+        if 2*(self._count + 1) > len(self._keys):
+            self._grow()
+
+        i = self._slot(key)
+        if self._keys[i] == EMPTY_KEY:
+            self._keys[i] = key
+            self._count += 1
+        self._values[i] = value
+
+    def get(self, key: int, default: float = DEFAULT_VALUE) -> float:
+        i = self._slot(key)
+        return self._values[i] if self._keys[i] == key else default
+
+    def items(self):
+        for key, value in zip(self._keys, self._values):
+            if key != EMPTY_KEY:
+                yield key, value
+
+    def _grow(self) -> None:
+        old_items = list(self.items())
+        self.__init__(self.board_size, capacity=2*len(self._keys))
+        for key, value in old_items:
+            self[key] = value
+
+    def save(self, path: str) -> None:
+        keys, values = self._keys, self._values
+        if sys.byteorder == 'big':  # file is always little endian
+            keys, values = array('q', keys), array('f', values)
+            keys.byteswap()
+            values.byteswap()
+
+        with open(path, 'wb') as file:
+            file.write(self._HEADER.pack(self._MAGIC, self._VERSION,
+                                         self.board_size, len(keys)))
+            keys.tofile(file)
+            values.tofile(file)
+
+    @classmethod
+    def load(cls, path: str) -> 'ValueTable':
+        with open(path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            try:
+                magic, version, board_size, capacity = cls._HEADER.unpack(
+                    file.read(cls._HEADER.size))
+            except struct.error:  # shorter than a header
+                magic = version = None
+            if (magic != cls._MAGIC) or (version != cls._VERSION):
+                raise ValueError(f'{path} is not a value table (version '
+                                 f'{cls._VERSION})')
+
+            slot_size = array('q').itemsize + array('f').itemsize
+            if size != cls._HEADER.size + capacity*slot_size:
+                raise ValueError(f'{path} is truncated or damaged')
+
+            table = cls(board_size, capacity=capacity)
+            table._keys = array('q')
+            table._keys.fromfile(file, capacity)
+            table._values = array('f')
+            table._values.fromfile(file, capacity)
+
+        if sys.byteorder == 'big':
+            table._keys.byteswap()
+            table._values.byteswap()
+
+        table._count = sum(1 for key in table._keys if key != EMPTY_KEY)
+        return table
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+import unittest
+from Analysis import analyse_games, parse_moves, replay
+
+
+class ReplayTest(unittest.TestCase):
+
+    def test_positions_before_each_move(self):
+        moves = [(0, 0), (1, 1), (2, 0)]
+        positions = list(replay(moves))
+
+        self.assertEqual([(m, c) for _, m, c in positions],
+                         [('X', (0, 0)), ('O', (1, 1)), ('X', (2, 0))])
+        self.assertEqual(len(positions[0][0].vacancies()), 9)
+        self.assertEqual(positions[2][0].get_elem(1, 1), 'O')
+
+    def test_moves_after_a_win(self):
+        moves = [(0, 0), (1, 0), (0, 1), (1, 1)]  # X wins on 2x2 at turn 2
+        self.assertRaises(ValueError, list, replay(moves, board_size=2))
+
+    def test_parse_moves(self):
+        self.assertEqual(parse_moves('0,0 2,1\n'), [(0, 0), (2, 1)])
+        self.assertEqual(parse_moves(''), [])
+
+
+class AnalyseTest(unittest.TestCase):
+
+    def test_games_in_order(self):
+        games = [[(0, 0), (1, 0), (0, 1)], [(1, 1), (0, 0), (1, 0)]]
+        results = list(analyse_games(games, board_size=2, workers=2,
+                                     max_pending=1))
+
+        self.assertEqual(len(results), 2)
+        for moves, positions in zip(games, results):
+            self.assertEqual([p.move for p in positions], moves)
+            for p in positions:
+                self.assertEqual(p.loss, p.best_score - p.score)
+                self.assertFalse(p.blunder)  # every move ties on 2x2
+
+        # a negative margin marks every move
+        flagged = next(analyse_games(games[:1], board_size=2, workers=1,
+                                     margin=-1))
+        self.assertTrue(all(p.blunder for p in flagged))
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def test_bot_is_checked(self):
+        for bot, message in (('nope', 'unknown bot "nope"'),
+                             ('Easy', 'can not score positions')):
+            with self.subTest(bot=bot):
+                result = subprocess.run(
+                    [sys.executable, 'Analysis.py', 'games.txt', '-b', bot],
+                    cwd=os.path.dirname(__file__), capture_output=True,
+                    text=True)
+                self.assertEqual(result.returncode, 2)
+                self.assertIn(message, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
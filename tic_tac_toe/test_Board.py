@@ -0,0 +1,88 @@
+import pickle
+import unittest
+from Board import Board, BoardSnapshot
+
+
+class CompletesLineTest(unittest.TestCase):
+
+    def board(self, cells, n=3):
+        board = Board(n=n)
+        for marker, (x, y) in cells:
+            board.set_elem(x, y, marker)
+        return board
+
+    def test_lines(self):
+        for line in ([(0, 1), (1, 1), (2, 1)],  # row
+                     [(2, 0), (2, 1), (2, 2)],  # column
+                     [(0, 0), (1, 1), (2, 2)],  # diagonal
+                     [(2, 0), (1, 1), (0, 2)]):  # reverse diagonal
+            with self.subTest(line=line):
+                board = self.board([('X', c) for c in line])
+                for x, y in line:
+                    self.assertTrue(board.completes_line(x, y))
+
+    def test_no_line(self):
+        board = self.board([('X', (0, 0)), ('X', (1, 0)), ('O', (2, 0)),
+                            ('X', (1, 1))])
+        for x, y in ((0, 0), (1, 0), (2, 0), (1, 1)):
+            self.assertFalse(board.completes_line(x, y))
+        self.assertFalse(board.completes_line(2, 2))  # empty cell
+
+    def test_larger_board(self):
+        board = self.board([('O', (i, 3 - i)) for i in range(4)], n=4)
+        self.assertTrue(board.completes_line(0, 3))
+        self.assertFalse(self.board([('O', (0, 3))],
+                                    n=4).completes_line(0, 3))
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def test_equal_states_hash_equal(self):
+        board, other = Board(n=3), Board(n=3)
+        for b in (board, other):
+            b.set_elem(0, 2, 'X')
+            b.set_elem(1, 1, 'O')
+
+        snapshot = board.snapshot()
+        self.assertEqual(snapshot, other.snapshot())
+        self.assertEqual(hash(snapshot), hash(other.snapshot()))
+        self.assertEqual(len({snapshot, other.snapshot()}), 1)
+
+        other.set_elem(2, 2, 'X')
+        self.assertNotEqual(snapshot, other.snapshot())
+        self.assertEqual(snapshot.get_elem(0, 2), 'X')
+        self.assertIsNone(snapshot.get_elem(2, 2))
+        self.assertEqual(len(snapshot.vacancies()), 7)
+
+    def test_immutable(self):
+        snapshot = Board(n=3).snapshot()
+        self.assertRaises(AttributeError, setattr, snapshot, 'cells', b'')
+        self.assertRaises(AttributeError, delattr, snapshot, 'board_size')
+        self.assertRaises(ValueError, BoardSnapshot, 3, bytes(8))
+
+    def test_pickle(self):
+        board = Board(n=4)
+        board.set_elem(3, 0, 'O')
+        snapshot = board.snapshot()
+
+        copy = pickle.loads(pickle.dumps(snapshot))
+        self.assertEqual(copy, snapshot)
+        self.assertEqual(hash(copy), hash(snapshot))
+
+    def test_restore(self):
+        board = Board(n=3)
+        board.set_elem(1, 0, 'X')
+        snapshot = board.snapshot()
+
+        board.set_elem(2, 2, 'O')
+        board.restore(snapshot)
+        self.assertEqual(board.snapshot(), snapshot)
+        self.assertIsNone(board.get_elem(2, 2))
+
+        board.restore(Board(n=4).snapshot())  # restoring can resize
+        self.assertEqual(board.board_size, 4)
+        self.assertEqual(len(board.vacancies()), 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
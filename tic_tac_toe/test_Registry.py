@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import unittest
+import Registry
+
+
+class RegistryTest(unittest.TestCase):
+
+    def test_lookup(self):
+        entry = Registry.find('hard')
+        self.assertIs(entry, Registry.get('max_likelihood'))
+        self.assertIs(Registry.find('RANDOM'), Registry.get('random'))
+        self.assertIsNone(Registry.find('no such agent'))
+
+        self.assertIn(Registry.get('human'), Registry.entries())
+        self.assertNotIn(Registry.get('human'), Registry.bots())
+        self.assertIn(Registry.get('max_likelihood'), Registry.bots(3))
+        self.assertNotIn(Registry.get('max_likelihood'), Registry.bots(4))
+        self.assertIn(Registry.get('random'), Registry.bots(10))
+        self.assertRaises(ValueError, Registry.register, 'random',
+                          'Players:BotRandom', ('0',), ())
+
+    def test_load(self):
+        entry = Registry.AgentEntry('test', 'Players:BotRandom', ('t',), ())
+        self.assertFalse(entry.loaded)
+
+        agent = entry.load()
+        self.assertTrue(entry.loaded)
+        self.assertEqual(agent.__name__, 'BotRandom')
+        self.assertIs(entry.load(), agent)
+
+    def test_menu_comes_from_the_registry(self):
+        for entry in Registry.entries():
+            with self.subTest(name=entry.name):
+                agent = entry.load()
+                self.assertFalse(hasattr(agent, 'keys'))
+                self.assertFalse(hasattr(agent, 'description'))
+                self.assertTrue(entry.keys and entry.description)
+
+    def test_registry_is_lazy(self):
+        # run in a fresh interpreter, the test session imports the agents
+        script = ('import sys, Registry\n'
+                  'Registry.find("hard")\n'
+                  'print("Players" in sys.modules)\n'
+                  'Registry.find("hard").load()\n'
+                  'print("Players" in sys.modules)\n')
+        output = subprocess.run([sys.executable, '-c', script],
+                                cwd=os.path.dirname(__file__),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.split(), ['False', 'True'])
+
+    def test_game_imports_no_heavy_bot(self):
+        script = ('import sys, TicTacToe\n'
+                  'print(sorted({"BotLearned", "BotMaxLikelihood",\n'
+                  '              "ValueTable"} & set(sys.modules)))\n')
+        output = subprocess.run([sys.executable, '-c', script],
+                                cwd=os.path.dirname(__file__),
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import random
+import unittest
+from Board import Board
+from SelfPlay import choose_move, merge, play_episode
+from ValueTable import cell_weights, encode
+
+
+class SelfPlayTest(unittest.TestCase):
+
+    def test_choose_move_is_greedy(self):
+        board = Board(n=3)
+        board.set_elem(1, 1, 'O')
+        best = encode(board, 'X') + cell_weights(3)[2]  # X at (2, 0)
+
+        coords, key = choose_move(board, 'X', {best: 0.9}, 0.0,
+                                  random.Random(0))
+        self.assertEqual((coords, key), ((2, 0), best))
+
+    def test_play_episode_updates(self):
+        # on a 2x2 board any two cells are in a line, so X always wins with
+        # its second move: O's only afterstate learns the loss, X's first
+        # afterstate backs up the win and its final afterstate is a win
+        values, visits = {}, {}
+        play_episode(Board(n=2), values, visits, alpha=0.5, epsilon=0.0,
+                     rng=random.Random(0))
+
+        self.assertEqual(sorted(values.values()), [0.25, 0.75, 1.0])
+        self.assertEqual(visits, dict.fromkeys(values, 1))
+
+    def test_merge_weights_by_visits(self):
+        merged = merge({1: 0.5, 2: 0.5}, [({1: 1.0}, {1: 3}),
+                                          ({1: 0.0, 3: 0.2}, {1: 1, 3: 2})])
+        self.assertEqual(merged, {1: 0.75, 2: 0.5, 3: 0.2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import Players
+from Tournament import (ELO_INITIAL, expected_score, play_game,
+                        run_tournament, schedule)
+
+
+class EloTest(unittest.TestCase):
+
+    def test_expected_score(self):
+        self.assertEqual(expected_score(1500, 1500), 0.5)
+        self.assertAlmostEqual(expected_score(1900, 1500), 10/11)
+        self.assertAlmostEqual(expected_score(1500, 1700)
+                               + expected_score(1700, 1500), 1.0)
+
+
+class TournamentTest(unittest.TestCase):
+
+    agents = (Players.BotRandom, Players.BotDefensive)
+
+    def test_schedule(self):
+        games = schedule(self.agents, (3, 4), 5)
+        self.assertEqual(len(games), 2*2*5)
+        self.assertEqual(len(set(games)), len(games))
+        self.assertTrue(all(first is not second
+                            for first, second, _, _ in games))
+
+    def test_play_game_is_reproducible(self):
+        game = (Players.BotRandom, Players.BotRandom, 3, 7)
+        winner, timings = play_game(game)
+
+        self.assertEqual(play_game(game)[0], winner)
+        self.assertIn(winner, (0, 1, None))
+        self.assertIn(timings[0][1] - timings[1][1], (0, 1))
+
+    def test_run_tournament(self):
+        stats = run_tournament(self.agents, seeds=4, workers=2)
+        random_bot, defensive = (stats[a.__name__] for a in self.agents)
+
+        self.assertEqual(random_bot['wins'], defensive['losses'])
+        self.assertEqual(random_bot['draws'], defensive['draws'])
+        self.assertEqual(sum(random_bot[k] for k in ('wins', 'draws',
+                                                     'losses')), 8)
+        self.assertAlmostEqual(random_bot['rating'] + defensive['rating'],
+                               2*ELO_INITIAL)
+
+    def test_default_agents_fit_the_board(self):
+        stats = run_tournament(board_sizes=(4,), seeds=1, workers=2)
+        self.assertNotIn('BotMaxLikelihood', stats)
+        self.assertIn('BotRandom', stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
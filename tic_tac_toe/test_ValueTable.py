@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from Board import Board
+from ValueTable import DEFAULT_VALUE, ValueTable, cell_weights, encode
+
+
+class EncodeTest(unittest.TestCase):
+
+    def test_relative_to_the_marker(self):
+        board = Board(n=3)
+        board.set_elem(0, 0, 'X')
+        board.set_elem(2, 1, 'O')
+
+        weights = cell_weights(3)
+        self.assertEqual(encode(board, 'X'), weights[0] + 2*weights[5])
+        self.assertEqual(encode(board, 'O'), 2*weights[0] + weights[5])
+        self.assertEqual(encode(Board(n=3), 'X'), 0)
+
+
+class ValueTableTest(unittest.TestCase):
+
+    def test_set_and_get(self):
+        table = ValueTable(3)
+        table[5] = 0.25
+        table[0] = 0.75
+
+        self.assertEqual(len(table), 2)
+        self.assertIn(5, table)
+        self.assertNotIn(7, table)
+        self.assertEqual(table[5], 0.25)
+        self.assertEqual(table.get(7), DEFAULT_VALUE)
+        self.assertRaises(KeyError, table.__getitem__, 7)
+
+        table[5] = 0.5  # replacing a value does not add a key
+        self.assertEqual((len(table), table[5]), (2, 0.5))
+
+    def test_growth(self):
+        table = ValueTable(3)
+        values = {key*7919: (key % 100)/100 for key in range(5000)}
+        for key, value in values.items():
+            table[key] = value
+
+        self.assertEqual(len(table), len(values))
+        self.assertGreaterEqual(len(table._keys), 2*len(values))
+        for key, value in values.items():
+            self.assertAlmostEqual(table[key], value, places=6)
+        self.assertEqual(dict(table.items()).keys(), values.keys())
+
+    def test_save_and_load(self):
+        table = ValueTable.from_dict(4, {1: 0.5, 3**15: 0.125, 42: 1.0})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.bin')
+            table.save(path)
+            loaded = ValueTable.load(path)
+
+        self.assertEqual(loaded.board_size, 4)
+        self.assertEqual(len(loaded), 3)
+        self.assertEqual(dict(loaded.items()), dict(table.items()))
+
+    def test_load_other_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.bin')
+            with open(path, 'wb') as file:
+                file.write(b'not a value table')
+            self.assertRaises(ValueError, ValueTable.load, path)
+
+            with open(path, 'wb') as file:
+                file.write(b'TTTV')
+            self.assertRaises(ValueError, ValueTable.load, path)
+
+    def test_load_truncated_file(self):
+        table = ValueTable.from_dict(3, {1: 0.5, 42: 1.0})
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'table.bin')
+            table.save(path)
+            with open(path, 'r+b') as file:
+                file.truncate(os.path.getsize(path) - 4)
+            self.assertRaises(ValueError, ValueTable.load, path)
+
+
+if __name__ == '__main__':
+    unittest.main()